@@ -0,0 +1,88 @@
+import numpy as np
+
+
+# Rank index of the live fish by birth order, a Fenwick tree (binary indexed tree) over fish IDs where each live fish
+# counts 1. Births and deaths update it in O(log n), and the k-th oldest live fish is found in O(log n) by walking down
+# the tree, so the oldest, the youngest and the elder and juvenile boundaries never need a sort
+class AgeIndex():
+    def __init__(self, capacity=1024):
+        self.alive = np.zeros(capacity, dtype=bool)
+        # tree[i] is the number of live IDs in (i - lowbit(i), i], with ID j stored at position j + 1
+        self.tree = np.zeros(capacity + 1, dtype=np.int64)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    # Builds the tree from the alive flags in one pass, used when growing and for large batches
+    def _rebuild(self):
+        counts = np.zeros(len(self.alive) + 1, dtype=np.int64)
+        np.cumsum(self.alive, out=counts[1:])
+        position = np.arange(1, len(self.alive) + 1)
+        self.tree = np.zeros(len(self.alive) + 1, dtype=np.int64)
+        self.tree[1:] = counts[position] - counts[position - (position & -position)]
+
+    def _grow(self, needed):
+        capacity = len(self.alive)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:len(self.alive)] = self.alive
+        self.alive = alive
+        self._rebuild()
+
+    def _change(self, fish_id, change):
+        position = fish_id + 1
+        tree = self.tree
+        size = len(tree)
+        while position < size:
+            tree[position] += change
+            position += position & -position
+
+    # Marks fish IDs as alive (add) or dead (remove). Large batches rebuild the tree instead of updating it ID by ID
+    def add(self, fish_ids):
+        fish_ids = np.asarray(fish_ids, dtype=np.int64)
+        if len(fish_ids) == 0:
+            return
+        self._grow(int(fish_ids.max()) + 1)
+        self._set(fish_ids, True)
+
+    def remove(self, fish_ids):
+        self._set(np.asarray(fish_ids, dtype=np.int64), False)
+
+    def _set(self, fish_ids, alive):
+        fish_ids = fish_ids[self.alive[fish_ids] != alive]
+        if len(fish_ids) == 0:
+            return
+        self.alive[fish_ids] = alive
+        self.count += len(fish_ids) if alive else -len(fish_ids)
+        if len(fish_ids) * 16 > len(self.alive):
+            self._rebuild()
+        else:
+            change = 1 if alive else -1
+            for fish_id in fish_ids.tolist():
+                self._change(fish_id, change)
+
+    # ID of the k-th oldest live fish (k = 1 is the oldest, k = len(self) the youngest)
+    def kth(self, k):
+        if not 1 <= k <= self.count:
+            raise ValueError("Rank " + str(k) + " is out of range for " + str(self.count) + " fish")
+        tree = self.tree
+        size = len(tree)
+        position = 0
+        step = 1 << (size - 1).bit_length()
+        while step:
+            following = position + step
+            if following < size and tree[following] < k:
+                position = following
+                k -= int(tree[following])
+            step >>= 1
+        return position
+
+    def oldest(self):
+        return self.kth(1) if self.count else None
+
+    def youngest(self):
+        return self.kth(self.count) if self.count else None
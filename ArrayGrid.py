@@ -0,0 +1,217 @@
+import numpy as np
+
+from Neighbourhood import CellNeighbours
+from Occupancy import Occupancy
+from Vision import FLOCK_RADIUS, PARTNER_RADIUS, reach, tuned_cell_size
+
+
+# Drop-in alternative to BoidGrid.Grid. Instead of a python list per cell, the grid rebuilds cell membership once per
+# tick with a counting sort: every entity is sorted by cell index and cell_start holds the offset each cell begins at.
+# The cells of one grid row are next to each other in that order, so a neighbourhood query is one slice per row
+class ArrayGrid:
+    def __init__(self, window, cell_size, debug=False):
+        self.window = window
+        # Without a cell size, the grid picks its own and adjusts it at each rebuild (see BoidGrid.create_grid)
+        self.auto = cell_size is None
+        self.FishList = None
+
+        # Every entity in the grid, in the order they were added (dicts keep insertion order)
+        self.entities = {}
+        # Entities removed since the last rebuild, they are still in the sorted order but are left out of queries
+        self.hidden = set()
+
+        self.sorted_entities = []
+        # Position and camouflage of each sorted entity at the last rebuild, camouflage is nan for entities that are
+        # not fish
+        self.sorted_x = np.zeros(0)
+        self.sorted_y = np.zeros(0)
+        self.sorted_camouflage = np.zeros(0)
+        self.built = False
+        # Scans made by neighbourhood(), by (row, column, cells), they are kept until the next rebuild
+        self.neighbour_cache = {}
+
+        # When debug is on, the grid checks itself after every change (slow, meant for tests)
+        self.debug = debug
+
+        self._layout(cell_size if not self.auto else tuned_cell_size(window, 0))
+
+    # Sets up the cells for the given cell size, the entities are sorted into them at the next rebuild
+    def _layout(self, cell_size):
+        self.cell_size = cell_size
+        self.columns = int(self.window[1] // cell_size)
+        self.rows = int(self.window[0] // cell_size)
+        self.cell_start = np.zeros(self.rows * self.columns + 1, dtype=np.int64)
+        # Summed-area table of the cell counts, built at each rebuild for density queries
+        self.occupancy = Occupancy(self.rows, self.columns)
+        self.built = False
+
+    # Changes the cell size and sorts every entity into the new cells
+    def resize(self, cell_size):
+        if cell_size != self.cell_size:
+            self._layout(cell_size)
+            self.rebuild()
+
+    def giveFishList(self, fishlist):
+        self.FishList = fishlist
+
+    # Returns the cell position of a particular x,y point
+    def cell_coords(self, x, y):
+        column = min(max(int(x // self.cell_size), 0), self.columns - 1)
+        row = min(max(int(y // self.cell_size), 0), self.rows - 1)
+        return row, column
+
+    # Sorts every entity into its current cell, this is called once per tick after the entities have moved. A grid that
+    # sizes itself checks its cell size first
+    def rebuild(self):
+        if self.auto:
+            cell_size = tuned_cell_size(self.window, len(self.entities), self.cell_size)
+            if cell_size != self.cell_size:
+                self._layout(cell_size)
+        entities = list(self.entities)
+        x = np.fromiter((entity.x for entity in entities), dtype=float, count=len(entities))
+        y = np.fromiter((entity.y for entity in entities), dtype=float, count=len(entities))
+        column = np.clip((x // self.cell_size).astype(np.int64), 0, self.columns - 1)
+        row = np.clip((y // self.cell_size).astype(np.int64), 0, self.rows - 1)
+        cell = row * self.columns + column
+
+        counts = np.bincount(cell, minlength=self.rows * self.columns)
+        self.cell_start[0] = 0
+        np.cumsum(counts, out=self.cell_start[1:])
+        order = np.argsort(cell, kind="stable")
+        self.sorted_entities = [entities[i] for i in order]
+        self.sorted_x = x[order]
+        self.sorted_y = y[order]
+        camouflage = np.fromiter((getattr(entity, "camouflage", np.nan) for entity in entities), dtype=float,
+                                 count=len(entities))
+        self.sorted_camouflage = camouflage[order]
+        fish_counts = np.bincount(cell, weights=~np.isnan(camouflage), minlength=self.rows * self.columns)
+        self.occupancy.build(counts.reshape(self.rows, self.columns),
+                             fish_counts.astype(np.int64).reshape(self.rows, self.columns))
+        self.hidden.clear()
+        self.neighbour_cache.clear()
+        self.built = True
+        if self.debug:
+            self.check_consistency()
+
+    # Offsets of the cells in columns c_min..c_max of a row, as one contiguous range of the sorted order
+    def _row_range(self, r, c_min, c_max):
+        first = r * self.columns + c_min
+        last = r * self.columns + c_max
+        return self.cell_start[first], self.cell_start[last + 1]
+
+    # Yields the (start, end) range of each row in the window of `cells` cells around (row, column)
+    def _window(self, row, column, cells):
+        if not self.built:
+            self.rebuild()
+        c_min = max(column - cells, 0)
+        c_max = min(column + cells, self.columns - 1)
+        for r in range(max(row - cells, 0), min(row + cells, self.rows - 1) + 1):
+            yield self._row_range(r, c_min, c_max)
+
+    # Offsets into the sorted order of every entity in the window of `cells` cells around (row, column)
+    def _window_index(self, row, column, cells):
+        ranges = list(self._window(row, column, cells))
+        if not ranges:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([np.arange(start, end) for start, end in ranges])
+
+    #Remove the fish from the grid, it disappears from queries straight away
+    def removeFish(self, fish, x=None, y=None):
+        if self.entities.pop(fish, None) is not None:
+            self.hidden.add(fish)
+        if self.debug:
+            self.check_consistency()
+
+    #This function removes all occurences of a fish in the grid
+    def wipeFish(self, fish):
+        self.removeFish(fish)
+
+    #Adds fish to the grid, new entities are placed into cells at the next rebuild
+    def addFish(self, fish):
+        self.entities[fish] = True
+        self.hidden.discard(fish)
+        if self.debug:
+            self.check_consistency()
+
+    # Positions are read at the next rebuild, so moving within the grid costs nothing
+    def updateFish(self, fish, x, y):
+        pass
+
+    # Same as updateFish for a batch of fish (see Grid.moveFishes), nothing to do until the next rebuild
+    def moveFishes(self, fishes, index, rows, columns):
+        pass
+
+    # Every entity in the grid, in the order queries visit them within a cell
+    def ordered_entities(self):
+        return list(self.entities)
+
+    # Debug check that no entity is sorted into more than one cell, that the cell offsets cover the sorted order and
+    # that removed entities are not still registered
+    def check_consistency(self):
+        seen = set()
+        for entity in self.sorted_entities:
+            if entity in seen:
+                raise RuntimeError("Duplicate grid entry for " + repr(entity))
+            seen.add(entity)
+        if self.cell_start[-1] != len(self.sorted_entities) or np.any(np.diff(self.cell_start) < 0):
+            raise RuntimeError("Cell offsets do not match the " + str(len(self.sorted_entities)) + " sorted entities")
+        stale = self.hidden.intersection(self.entities)
+        if stale:
+            raise RuntimeError("Removed entities are still registered: " + repr(stale))
+
+    # Scans the window of `cells` cells around (row, column) once, the scan is cached until the next rebuild
+    def _cell_neighbours(self, row, column, cells):
+        key = (row, column, cells)
+        found = self.neighbour_cache.get(key)
+        if found is None:
+            index = self._window_index(row, column, cells)
+            found = CellNeighbours([self.sorted_entities[i] for i in index.tolist()], self.sorted_x[index],
+                                   self.sorted_y[index], ~np.isnan(self.sorted_camouflage[index]))
+            self.neighbour_cache[key] = found
+        return found
+
+    # The neighbours within radius pixels of an entity (itself included), with their offsets and distances, from a
+    # single cached scan of its cell's window. neighbourhood(fish, 30).within(15) is what get_neighbour(fish, 15) lists
+    def neighbourhood(self, fish, radius):
+        if not self.built:
+            self.rebuild()
+        row, column = self.cell_coords(fish.x, fish.y)
+        return self._cell_neighbours(row, column, reach(radius, self.cell_size)).around(fish.x, fish.y, radius,
+                                                                                        self.hidden)
+
+    #Gets the entities within radius pixels of the fish
+    def get_neighbour(self, fish, radius):
+        return self.neighbourhood(fish, radius).entities
+
+    # The entities within radius pixels along with their positions and camouflage as arrays, so they can be scored all
+    # at once. The arrays are taken from the ones sorted at the last rebuild
+    def gather_in_radius(self, fish, radius):
+        row, column = self.cell_coords(fish.x, fish.y)
+        index = self._window_index(row, column, reach(radius, self.cell_size))
+        index = index[(self.sorted_x[index] - fish.x) ** 2 + (self.sorted_y[index] - fish.y) ** 2 <= radius ** 2]
+        found = [self.sorted_entities[i] for i in index.tolist()]
+        if self.hidden:
+            visible = np.array([entity not in self.hidden for entity in found], dtype=bool)
+            found = [entity for entity, keep in zip(found, visible) if keep]
+            index = index[visible]
+        return found, self.sorted_x[index], self.sorted_y[index], self.sorted_camouflage[index]
+
+    # Number of entities in the cells that can hold something within radius pixels of the point x,y, as of the last
+    # rebuild. It is never less than the number actually within the radius, so 0 means there is nothing there. With
+    # fish_only, predators are not counted. x and y can also be arrays
+    def density(self, x, y, radius, fish_only=False):
+        if not self.built:
+            self.rebuild()
+        column = np.clip((np.asarray(x) // self.cell_size).astype(np.int64), 0, self.columns - 1)
+        row = np.clip((np.asarray(y) // self.cell_size).astype(np.int64), 0, self.rows - 1)
+        return self.occupancy.count(row, column, reach(radius, self.cell_size), fish_only)
+
+    #Counts the number of neighbouring entities within radius pixels, if it finds more than 3, returns true meaning the
+    #fish is in a flock
+    def count_flock(self, fish, radius=FLOCK_RADIUS):
+        flock_num = 3
+        return len(self.neighbourhood(fish, radius)) > flock_num
+
+    #Find closest fish to reproduce with, within radius pixels
+    def getPartner(self, fish, radius=PARTNER_RADIUS):
+        return self.neighbourhood(fish, radius).closest_fish(fish)
@@ -1,14 +1,69 @@
 import numpy as np
 
+from ArrayGrid import ArrayGrid
+from Neighbourhood import CellNeighbours
+from Occupancy import Occupancy
+from Vision import FLOCK_RADIUS, PARTNER_RADIUS, reach, tuned_cell_size
+
+
+# Creates the grid used by the simulation, "list" is the list-of-lists Grid below and "array" is the counting sort
+# ArrayGrid. Both have the same methods, so the boids and food points work with either.
+# Queries take radii in pixels, so the cell size does not change what they find, only how fast they are and the order
+# the entities come in. With a cell_size of None the grid picks its own from the largest query radius and the number
+# of entities, and adjusts it at each rebuild
+def create_grid(window, cell_size, backend="list", debug=False):
+    if backend == "list":
+        return Grid(window, cell_size, debug)
+    if backend == "array":
+        return ArrayGrid(window, cell_size, debug)
+    raise ValueError("Unknown grid backend: " + str(backend))
+
+
 class Grid:
-    def __init__(self,window,cell_size):
+    def __init__(self,window,cell_size,debug=False):
+        self.window = window
+        self.auto = cell_size is None
+        self.FishList = None
+
+        # When debug is on, the grid checks itself after every change (slow, meant for tests)
+        self.debug = debug
+
+        self._layout(cell_size if not self.auto else tuned_cell_size(window, 0))
+
+    # Creates an empty grid of cells of the given size
+    def _layout(self,cell_size):
 
         #Create matrix of empty lists, representing the screen space as a grid
         self.cell_size = cell_size
-        self.columns = int(window[1] // cell_size)
-        self.rows = int(window[0] // cell_size)
+        self.columns = int(self.window[1] // cell_size)
+        self.rows = int(self.window[0] // cell_size)
         self.grid = [[[] for i in range(self.columns)] for i in range(self.rows)]
-        self.FishList = None
+
+        # Reverse index of the cell each entity is in, so an entity can be found without searching the grid
+        self.cell_of = {}
+
+        # Number of entities and fish in each cell, kept up to date on every change. Density queries use the
+        # summed-area table built from them at each rebuild, so they see the counts as they were at the end of the last
+        # tick
+        self.counts = np.zeros((self.rows, self.columns), dtype=np.int64)
+        self.fish_counts = np.zeros((self.rows, self.columns), dtype=np.int64)
+        self.occupancy = Occupancy(self.rows, self.columns)
+        # Scans made by neighbourhood(), by (row, column, cells), each with the change number it was made at. Every
+        # change to a cell (an entity joining, leaving or moving in it) is numbered in `changed`, and a scan is only
+        # used while none of the cells in its window have changed since it was made. All scans are dropped at each
+        # rebuild
+        self.neighbour_cache = {}
+        self.changes = 0
+        self.changed = np.zeros((self.rows, self.columns), dtype=np.int64)
+
+    # Changes the cell size, every entity is put back in the order of the old cells
+    def resize(self,cell_size):
+        if cell_size == self.cell_size:
+            return
+        entities = self.ordered_entities()
+        self._layout(cell_size)
+        for fish in entities:
+            self.addFish(fish)
 
     def giveFishList(self,fishlist):
         self.FishList = fishlist
@@ -16,81 +71,176 @@ class Grid:
     # Returns the cell position of a particular x,y point
     def cell_coords(self,x,y):
 
-        column = int(x/self.cell_size)
-        row = int(y/self.cell_size)
-        column = np.clip(column,0,self.columns-1)
-        row = np.clip(row,0,self.rows-1)
+        column = min(max(int(x // self.cell_size), 0), self.columns - 1)
+        row = min(max(int(y // self.cell_size), 0), self.rows - 1)
         return row,column
 
-    #Remove the fish from its current grid cell
+    #Remove the fish from its current grid cell, the reverse index says which cell that is so x and y are not needed
     def removeFish(self,fish,x=None,y=None):
-        if x is None or y is None:
-            x, y = fish.x, fish.y
-        row, col = self.cell_coords(x, y)
-        if fish in self.grid[row][col]:
-            self.grid[row][col].remove(fish)
+        cell = self.cell_of.pop(fish, None)
+        if cell is not None:
+            self.grid[cell[0]][cell[1]].remove(fish)
+            self._count(fish, cell, -1)
+            self._touch(cell)
+        if self.debug:
+            self.check_consistency()
 
-    #This function removes all occurences of a fish in the grid
+    #This function removes all occurences of a fish in the grid. An entity can only be in one cell, so this is the same
+    #as removeFish
     def wipeFish(self,fish):
-        counter = 0
-        pos_list = []
-        for row in range(self.rows):
-            for col in range(self.columns):
-                if fish in self.grid[row][col]:
-                    self.grid[row][col].remove(fish)
-                    counter += 1
-                    pos_list.append([row,col])
-
+        self.removeFish(fish)
 
-    #Adds fish to its current cell
+    #Adds fish to its current cell, if the fish is already in the grid it is moved instead of being added twice. The
+    #fish may have moved even if it stays in the same cell, so scans covering its cell are out of date either way
     def addFish(self,fish):
         row,column = self.cell_coords(fish.x,fish.y)
-        self.grid[row][column].append(fish)
+        cell = self.cell_of.get(fish)
+        if cell != (row,column):
+            if cell is not None:
+                self.grid[cell[0]][cell[1]].remove(fish)
+                self._count(fish, cell, -1)
+                self._touch(cell)
+            self.grid[row][column].append(fish)
+            self.cell_of[fish] = (row,column)
+            self._count(fish, (row,column), 1)
+        self._touch((row,column))
+        if self.debug:
+            self.check_consistency()
 
+    #Moves the fish to the cell of its new position
     def updateFish(self,fish,x,y):
         self.addFish(fish)
-        self.removeFish(fish,x,y)
 
+    #Moves fishes[i] for every i in index to the cell (rows, columns) worked out for it by the caller, all in one go.
+    #This is how FishSchool moves the fish that changed cell in a tick. Fish that are not in the grid are left out
+    def moveFishes(self,fishes,index,rows,columns):
+        grid = self.grid
+        cell_of = self.cell_of
+        old_rows = np.empty(len(index), dtype=np.int64)
+        old_columns = np.empty(len(index), dtype=np.int64)
+        moved = np.ones(len(index), dtype=bool)
+        for k, (i, row, column) in enumerate(zip(index.tolist(), rows.tolist(), columns.tolist())):
+            fish = fishes[i]
+            cell = cell_of.get(fish)
+            if cell is None:
+                moved[k] = False
+                continue
+            grid[cell[0]][cell[1]].remove(fish)
+            grid[row][column].append(fish)
+            cell_of[fish] = (row,column)
+            old_rows[k], old_columns[k] = cell
+        old_cells = (old_rows[moved], old_columns[moved])
+        new_cells = (rows[moved], columns[moved])
+        for counts in (self.counts, self.fish_counts):
+            np.add.at(counts, old_cells, -1)
+            np.add.at(counts, new_cells, 1)
+        self.changes += 1
+        self.changed[old_cells] = self.changes
+        self.changed[new_cells] = self.changes
+        if self.debug:
+            self.check_consistency()
 
-    #Gets fish in nearby cells
-    def get_neighbour(self,fish,vision_range):
+    # Every entity in the grid, cell by cell in the order queries visit them
+    def ordered_entities(self):
+        return [fish for row in self.grid for cell in row for fish in cell]
+
+    # Debug check that every entity is in exactly one cell, that this cell is the one in the reverse index and that the
+    # reverse index has no stale entries
+    def check_consistency(self):
+        seen = {}
+        for row in range(self.rows):
+            for col in range(self.columns):
+                for fish in self.grid[row][col]:
+                    if fish in seen:
+                        raise RuntimeError("Duplicate grid entry for " + repr(fish) + " in cells " +
+                                           str(seen[fish]) + " and " + str((row, col)))
+                    seen[fish] = (row, col)
+                    if self.cell_of.get(fish) != (row, col):
+                        raise RuntimeError("Reverse index has " + str(self.cell_of.get(fish)) + " for " +
+                                           repr(fish) + " but it is in cell " + str((row, col)))
+        for fish in self.cell_of:
+            if fish not in seen:
+                raise RuntimeError("Stale reverse index entry for " + repr(fish))
+
+    # Numbers a change to the cell, so the cached scans that cover it are made again
+    def _touch(self,cell):
+        self.changes += 1
+        self.changed[cell] = self.changes
+
+    # Adds change to the counts of the cell, only fish (entities with a camouflage) count towards fish_counts
+    def _count(self,fish,cell,change):
+        self.counts[cell] += change
+        if hasattr(fish, "camouflage"):
+            self.fish_counts[cell] += change
+
+    # The cell lists are kept up to date on every move, so only the occupancy table is rebuilt at the end of a tick,
+    # and the cached neighbourhood scans are dropped. A grid that sizes itself checks its cell size first
+    def rebuild(self):
+        if self.auto:
+            self.resize(tuned_cell_size(self.window, len(self.cell_of), self.cell_size))
+        self.occupancy.build(self.counts, self.fish_counts)
+        self.neighbour_cache.clear()
+
+    # Number of entities in the cells that can hold something within radius pixels of the point x,y, from the occupancy
+    # table. It is never less than the number actually within the radius, so 0 means there is nothing there. With
+    # fish_only, predators are not counted. x and y can also be arrays
+    def density(self,x,y,radius,fish_only=False):
+        if not self.occupancy.built:
+            self.rebuild()
+        column = np.clip((np.asarray(x) // self.cell_size).astype(np.int64), 0, self.columns - 1)
+        row = np.clip((np.asarray(y) // self.cell_size).astype(np.int64), 0, self.rows - 1)
+        return self.occupancy.count(row, column, reach(radius, self.cell_size), fish_only)
+
+    # Scans the window of `cells` cells around (row, column) once. The scan is cached and reused by later queries from
+    # the same cell until an entity joins, leaves or moves within the window
+    def _cell_neighbours(self,row,column,cells):
+        key = (row,column,cells)
+        r_min, r_max = max(row - cells, 0), min(row + cells, self.rows - 1)
+        c_min, c_max = max(column - cells, 0), min(column + cells, self.columns - 1)
+        cached = self.neighbour_cache.get(key)
+        if cached is not None and (cached[0] == self.changes or
+                                   self.changed[r_min:r_max + 1, c_min:c_max + 1].max() <= cached[0]):
+            found = cached[1]
+        else:
+            entities = []
+            for r in range(r_min, r_max + 1):
+                for c in range(c_min, c_max + 1):
+                    entities.extend(self.grid[r][c])
+            x = np.fromiter((entity.x for entity in entities), dtype=float, count=len(entities))
+            y = np.fromiter((entity.y for entity in entities), dtype=float, count=len(entities))
+            is_fish = np.fromiter((hasattr(entity, "camouflage") for entity in entities), dtype=bool,
+                                  count=len(entities))
+            found = CellNeighbours(entities, x, y, is_fish)
+            self.neighbour_cache[key] = (self.changes, found)
+        return found
+
+    # The neighbours within radius pixels of an entity (itself included), with their offsets and distances, from a
+    # single cached scan of its cell's window. neighbourhood(fish, 30).within(15) is what get_neighbour(fish, 15) lists
+    def neighbourhood(self,fish,radius):
         row,column = self.cell_coords(fish.x,fish.y)
-        neighbours = []
-        for i in range(-vision_range,vision_range+1):
-            for j in range(-vision_range,vision_range+1):
-                r = row + i
-                c = column + j
-                if 0 < r < self.rows and 0 < c < self.columns:
-                    neighbours.extend(self.grid[r][c])
-                else:
-                    pass
-        return neighbours
-
-    #Counts the number of neighbouring fish, if it finds 3, returns true meaning the fish is in a flock
-    def count_flock(self,fish):
-        neighbour_count = 0
+        return self._cell_neighbours(row,column,reach(radius,self.cell_size)).around(fish.x,fish.y,radius)
+
+    #Gets the entities within radius pixels of the fish
+    def get_neighbour(self,fish,radius):
+        return self.neighbourhood(fish,radius).entities
+
+    # The entities within radius pixels along with their positions and camouflage as arrays, so they can be scored all
+    # at once. Entities that are not fish have a camouflage of nan
+    def gather_in_radius(self,fish,radius):
+        found = self.get_neighbour(fish,radius)
+        x = np.fromiter((entity.x for entity in found), dtype=float, count=len(found))
+        y = np.fromiter((entity.y for entity in found), dtype=float, count=len(found))
+        camouflage = np.fromiter((getattr(entity, "camouflage", np.nan) for entity in found), dtype=float,
+                                 count=len(found))
+        return found, x, y, camouflage
+
+    #Counts the number of neighbouring entities within radius pixels, if it finds more than 3, returns true meaning the
+    #fish is in a flock
+    def count_flock(self,fish,radius=FLOCK_RADIUS):
         flock_num = 3
-        row, column = self.cell_coords(fish.x, fish.y)
-        for i in range(-2,3):
-            for j in range(-2,3):
-                r = row + i
-                c = column + j
-                if 0 < r < self.rows and 0 < c < self.columns:
-                    neighbour_count += len(self.grid[r][c])
-                if neighbour_count > flock_num:
-                    return True
-        return False
-
-    #Find closest fish to reproduce with
-    def getPartner(self, fish):
-        partners = []
-        row, column = self.cell_coords(fish.x, fish.y)
-        for i in range(-3, 4):
-            for j in range(-3, 4):
-                r = row + i
-                c = column + j
-                if 0 < r < self.rows and 0 < c < self.columns:
-                    partners.extend(self.grid[r][c])
-                if partners:
-                    return partners[0]
-        return None
\ No newline at end of file
+        return len(self.neighbourhood(fish, radius)) > flock_num
+
+    #Find closest fish to reproduce with, within radius pixels
+    def getPartner(self, fish, radius=PARTNER_RADIUS):
+        return self.neighbourhood(fish, radius).closest_fish(fish)
+
@@ -0,0 +1,256 @@
+import numpy as np
+
+from Vision import FLOCK_RADIUS, SEPARATION_RADIUS, reach
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+# Array versions of the per-fish boid calculations, used by FishSchool to step every fish at once.
+# Positions follow the same convention as FishBoid: x is bounded by window[0] and maps to grid columns,
+# y is bounded by window[1] and maps to grid rows.
+# When Numba is installed, the boid forces, edge avoidance and speed limit run as compiled loops over the cell-sorted
+# arrays instead (same results, summed in the same order). Without it everything falls back to NumPy
+
+# Whether the compiled kernels are used, see use_compiled()
+COMPILED = numba is not None
+_warmed_up = False
+
+
+# Turns the compiled kernels on or off (they can only be turned on when Numba is installed), returns the new setting
+def use_compiled(enabled=True):
+    global COMPILED
+    COMPILED = enabled and numba is not None
+    return COMPILED
+
+
+# Compiles the kernels on a tiny school, so the compile time is spent before the first frame rather than during it.
+# Numba caches the compiled code on disk, so after the first run this only loads it
+def warmup():
+    global _warmed_up
+    if not COMPILED or _warmed_up:
+        return
+    x = np.array([20.0, 25.0, 40.0])
+    y = np.array([20.0, 30.0, 35.0])
+    velocity = np.ones(3)
+    row, column = cell_coords(x, y, 15, 4, 4)
+    order, start = bin_cells(row, column, 4, 4)
+    neighbour_forces(x, y, velocity, velocity, row, column, order, start, 4, 4, 15)
+    avoid_edge(x, y, velocity, velocity, (60.0, 60.0))
+    speed_limit(velocity, velocity, np.full(3, 1.6))
+    _warmed_up = True
+
+# Returns the row, column of every point, matching Grid.cell_coords
+def cell_coords(x, y, cell_size, rows, columns):
+    column = np.clip((x // cell_size).astype(np.int64), 0, columns - 1)
+    row = np.clip((y // cell_size).astype(np.int64), 0, rows - 1)
+    return row, column
+
+
+# Counting sort of points into grid cells. Returns the order that groups the points by cell, and the offset that
+# each cell starts at in that order (cell c holds order[start[c]:start[c + 1]])
+def bin_cells(row, column, rows, columns):
+    cell = row * columns + column
+    counts = np.bincount(cell, minlength=rows * columns)
+    start = np.zeros(rows * columns + 1, dtype=np.int64)
+    np.cumsum(counts, out=start[1:])
+    order = np.argsort(cell, kind="stable")
+    return order, start
+
+
+# Finds every (point, entity) pair whose cells are within `cells` cells of each other, scanning the window of each
+# point row by row like the grids do
+def window_pairs(row, column, order, start, rows, columns, cells):
+    n = len(row)
+    query = np.arange(n)
+    owners = []
+    members = []
+    for i in range(-cells, cells + 1):
+        for j in range(-cells, cells + 1):
+            r = row + i
+            c = column + j
+            visible = (0 <= r) & (r < rows) & (0 <= c) & (c < columns)
+            q = query[visible]
+            cell = r[visible] * columns + c[visible]
+            begin = start[cell]
+            count = start[cell + 1] - begin
+            total = count.sum()
+            if total == 0:
+                continue
+            # Expand each (fish, cell) into one entry per occupant of the cell
+            offsets = np.repeat(np.cumsum(count) - count, count)
+            slots = np.repeat(begin, count) + np.arange(total) - offsets
+            owners.append(np.repeat(q, count))
+            members.append(order[slots])
+    if not owners:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    owners = np.concatenate(owners)
+    members = np.concatenate(members)
+    # Group the pairs by owner, keeping the scan order within each owner
+    grouped = np.argsort(owners, kind="stable")
+    return owners[grouped], members[grouped]
+
+
+# Every (point, entity) pair within `radius` pixels of each other, with their squared distance, grouped by point in
+# scan order. The points are at (query_x, query_y) in cells (row, column), the entities are the cell-sorted x and y
+def radius_pairs(query_x, query_y, row, column, x, y, order, start, rows, columns, cell_size, radius):
+    owners, members = window_pairs(row, column, order, start, rows, columns, reach(radius, cell_size))
+    dx = query_x[owners] - x[members]
+    dy = query_y[owners] - y[members]
+    distance_sq = dx ** 2 + dy ** 2
+    inside = distance_sq <= radius ** 2
+    return owners[inside], members[inside], distance_sq[inside]
+
+
+# Cohesion and alignment over the neighbours within FLOCK_RADIUS, separation over the ones within SEPARATION_RADIUS
+# (FishBoid.Combining_Steers). The pairs are the ones from radius_pairs with FLOCK_RADIUS
+def boid_forces(x, y, Vx, Vy, owners, members, distance_sq, n):
+    count = np.bincount(owners, minlength=n).astype(float)
+    total_weight = count + 0.00000001
+
+    cohesion_x = (np.bincount(owners, x[members], n) / total_weight - x) * 0.1
+    cohesion_y = (np.bincount(owners, y[members], n) / total_weight - y) * 0.1
+
+    alignment_x = np.bincount(owners, Vx[members], n) / total_weight
+    alignment_y = np.bincount(owners, Vy[members], n) / total_weight
+
+    close = distance_sq <= SEPARATION_RADIUS ** 2
+    dx = x[owners[close]] - x[members[close]]
+    dy = y[owners[close]] - y[members[close]]
+    distance = np.sqrt(dx ** 2 + dy ** 2)
+    apart = distance > 0
+    separation_x = np.bincount(owners[close][apart], dx[apart] / distance[apart], n)
+    separation_y = np.bincount(owners[close][apart], dy[apart] / distance[apart], n)
+
+    return (cohesion_x, cohesion_y), (separation_x, separation_y), (alignment_x, alignment_y), count
+
+
+# The boid forces of every fish over the fish within FLOCK_RADIUS, straight from the cell-sorted order. The compiled
+# kernel walks the cells itself, the NumPy path goes through radius_pairs (pairs can be passed in if they are already
+# known)
+def neighbour_forces(x, y, Vx, Vy, row, column, order, start, rows, columns, cell_size, pairs=None):
+    if COMPILED:
+        forces = _neighbour_forces(x, y, Vx, Vy, row, column, order, start, rows, columns,
+                                   reach(FLOCK_RADIUS, cell_size), float(FLOCK_RADIUS ** 2),
+                                   float(SEPARATION_RADIUS ** 2))
+        return (forces[0], forces[1]), (forces[2], forces[3]), (forces[4], forces[5]), forces[6]
+    if pairs is None:
+        pairs = radius_pairs(x, y, row, column, x, y, order, start, rows, columns, cell_size, FLOCK_RADIUS)
+    return boid_forces(x, y, Vx, Vy, *pairs, len(x))
+
+
+# The wall force from FishBoid.avoidEdge, followed by the sharp turn at the margin
+def avoid_edge(x, y, Vx, Vy, window):
+    if COMPILED:
+        return _avoid_edge(x, y, Vx, Vy, float(window[0]), float(window[1]))
+    margin = 20
+    with np.errstate(divide="ignore", invalid="ignore"):
+        force_x = 200 * (1 / (x ** 2) - 1 / ((x - window[0]) ** 2))
+        force_y = 200 * (1 / (y ** 2) - 1 / ((y - window[1]) ** 2))
+    Vx = Vx + np.where((x != 0) & (x != window[0]), np.clip(force_x, -10, 10), 0)
+    Vy = Vy + np.where((y != 0) & (y != window[1]), np.clip(force_y, -10, 10), 0)
+
+    Vx = np.where((x < margin) | (x > window[0] - margin), -Vx, Vx)
+    Vy = np.where((y < margin) | (y > window[1] - margin), -Vy, Vy)
+    return Vx, Vy
+
+
+# Normalise the speed of every fish between v_min and its v_max (FishBoid.speed_limit)
+def speed_limit(Vx, Vy, v_max, v_min=0.05):
+    if COMPILED:
+        return _speed_limit(Vx, Vy, v_max.astype(float), v_min)
+    vel_norm = np.sqrt(Vx ** 2 + Vy ** 2)
+    scale = np.ones_like(vel_norm)
+    too_fast = vel_norm > v_max
+    too_slow = (vel_norm < v_min) & (vel_norm > 0)
+    scale[too_fast] = v_max[too_fast] / vel_norm[too_fast]
+    scale[too_slow] = v_min / vel_norm[too_slow]
+    return Vx * scale, Vy * scale
+
+
+if numba is not None:
+    # Compiled version of radius_pairs followed by boid_forces. Each fish visits the cells of its window in the same
+    # order as window_pairs and keeps the same neighbours, so the sums are added up in the same order as np.bincount
+    # adds them
+    @numba.njit(cache=True)
+    def _neighbour_forces(x, y, Vx, Vy, row, column, order, start, rows, columns, cells, flock_sq, separation_sq):
+        n = len(x)
+        forces = np.zeros((7, n))
+        for f in range(n):
+            sum_x = 0.0
+            sum_y = 0.0
+            sum_Vx = 0.0
+            sum_Vy = 0.0
+            separation_x = 0.0
+            separation_y = 0.0
+            count = 0
+            for i in range(-cells, cells + 1):
+                r = row[f] + i
+                if r < 0 or r >= rows:
+                    continue
+                for j in range(-cells, cells + 1):
+                    c = column[f] + j
+                    if c < 0 or c >= columns:
+                        continue
+                    cell = r * columns + c
+                    for slot in range(start[cell], start[cell + 1]):
+                        m = order[slot]
+                        dx = x[f] - x[m]
+                        dy = y[f] - y[m]
+                        distance_sq = dx * dx + dy * dy
+                        if distance_sq > flock_sq:
+                            continue
+                        sum_x += x[m]
+                        sum_y += y[m]
+                        sum_Vx += Vx[m]
+                        sum_Vy += Vy[m]
+                        count += 1
+                        if distance_sq <= separation_sq:
+                            distance = np.sqrt(distance_sq)
+                            if distance > 0:
+                                separation_x += dx / distance
+                                separation_y += dy / distance
+            total_weight = count + 0.00000001
+            forces[0, f] = (sum_x / total_weight - x[f]) * 0.1
+            forces[1, f] = (sum_y / total_weight - y[f]) * 0.1
+            forces[2, f] = separation_x
+            forces[3, f] = separation_y
+            forces[4, f] = sum_Vx / total_weight
+            forces[5, f] = sum_Vy / total_weight
+            forces[6, f] = count
+        return forces
+
+    @numba.njit(cache=True)
+    def _avoid_edge(x, y, Vx, Vy, width, height):
+        margin = 20
+        new_Vx = Vx.copy()
+        new_Vy = Vy.copy()
+        for f in range(len(x)):
+            if x[f] != 0 and x[f] != width:
+                new_Vx[f] += min(max(200 * (1 / (x[f] * x[f]) - 1 / ((x[f] - width) * (x[f] - width))), -10), 10)
+            if y[f] != 0 and y[f] != height:
+                new_Vy[f] += min(max(200 * (1 / (y[f] * y[f]) - 1 / ((y[f] - height) * (y[f] - height))), -10), 10)
+            if x[f] < margin or x[f] > width - margin:
+                new_Vx[f] = -new_Vx[f]
+            if y[f] < margin or y[f] > height - margin:
+                new_Vy[f] = -new_Vy[f]
+        return new_Vx, new_Vy
+
+    @numba.njit(cache=True)
+    def _speed_limit(Vx, Vy, v_max, v_min):
+        new_Vx = Vx.copy()
+        new_Vy = Vy.copy()
+        for f in range(len(Vx)):
+            vel_norm = np.sqrt(Vx[f] * Vx[f] + Vy[f] * Vy[f])
+            if vel_norm > v_max[f]:
+                scale = v_max[f] / vel_norm
+            elif vel_norm < v_min and vel_norm > 0:
+                scale = v_min / vel_norm
+            else:
+                scale = 1.0
+            new_Vx[f] = Vx[f] * scale
+            new_Vy[f] = Vy[f] * scale
+        return new_Vx, new_Vy
@@ -0,0 +1,183 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from FishSchool import FishSchool, SchoolFish
+from PredatorBoid import PredatorBoid
+from Simulation import Simulation
+
+# Bumped whenever the layout of a checkpoint changes
+VERSION = 5
+# Fields saved for every predator and food point
+PREDATOR_FIELDS = ("x", "y", "Vx", "Vy")
+FOOD_FIELDS = ("x", "y", "max_capacity", "capacity", "active", "internalTime", "TimeOut", "size")
+
+
+# Copies the full state of a simulation into a dictionary of numpy arrays, ready to be written with np.savez.
+# The grid is rebuilt first so the entity order it saves is the one queries will use next tick, this way a resumed
+# run and the run that carried on after saving make exactly the same moves
+def snapshot(simulation):
+    simulation.grid.rebuild()
+    fishes = simulation.fishes
+    n = len(fishes)
+    arrays = {}
+    for name in FishSchool.FIELDS:
+        arrays["fish_" + name] = getattr(fishes, name)[:n].copy()
+    for name in PREDATOR_FIELDS:
+        arrays["predator_" + name] = np.array([getattr(predator, name) for predator in simulation.predators],
+                                              dtype=float)
+    for name in FOOD_FIELDS:
+        arrays["food_" + name] = np.array([getattr(foodpoint, name) for foodpoint in simulation.foodpoints])
+
+    # Grid order of every entity, fish by their slot in the school and predators as -1, -2, ...
+    slot = {fish: i for i, fish in enumerate(fishes.fish[:n])}
+    slot.update({predator: -1 - i for i, predator in enumerate(simulation.predators)})
+    arrays["grid_order"] = np.array([slot[entity] for entity in simulation.grid.ordered_entities()
+                                     if entity in slot], dtype=np.int64)
+
+    # The oldest fish may already have died, so its record is saved on its own
+    oldest = simulation.oldest_fish
+    arrays["oldest_slot"] = np.array(slot.get(oldest, -1) if oldest is not None else -2)
+    if oldest is not None:
+        for name in FishSchool.FIELDS:
+            arrays["oldest_" + name] = getattr(oldest._store, name)[oldest._index:oldest._index + 1].copy()
+
+    # The generators' states go in the metadata, the noise they had drawn but not used yet is saved with the arrays
+    generators, noise = simulation.random.get_state()
+    for name, values in noise.items():
+        arrays["noise_" + name] = values
+
+    meta = {"version": VERSION, "window": list(simulation.window), "cell_size": simulation.cell_size,
+            "evo_and_learn": simulation.evo_and_learn, "stochastic": simulation.stochastic,
+            "reproduce_time": fishes.reproduceTime, "next_id": int(fishes.next_id),
+            "grid_backend": simulation.grid_backend, "grid_cell_size": simulation.grid.cell_size,
+            "seed": simulation.seed,
+            "Time": simulation.Time, "Fish_eaten": simulation.Fish_eaten, "Fish_starved": simulation.Fish_starved,
+            "death_age_total": int(simulation.death_age_total),
+            "random": generators}
+    arrays["meta"] = np.array(json.dumps(meta))
+    return arrays
+
+
+# Writes the arrays to a temporary file first, so an interrupted save never leaves a half-written checkpoint behind
+def write_arrays(arrays, path):
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        np.savez_compressed(file, **arrays)
+    os.replace(temporary, path)
+
+
+# Saves a checkpoint of the simulation. The state is copied straight away, but compressing and writing it happens on a
+# background thread, which is returned so the caller can wait for it
+def save_checkpoint(simulation, path, background=True):
+    arrays = snapshot(simulation)
+    if not background:
+        write_arrays(arrays, path)
+        return None
+    thread = threading.Thread(target=write_arrays, args=(arrays, path), daemon=False)
+    thread.start()
+    return thread
+
+
+# Recreates a simulation from a checkpoint, it carries on exactly where the saved run was. A Telemetry can be given to
+# keep streaming the run's deaths and snapshots
+def load_checkpoint(path, verbose=True, telemetry=None):
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files}
+    meta = json.loads(str(arrays["meta"]))
+    if meta["version"] != VERSION:
+        raise ValueError("Checkpoint version " + str(meta["version"]) + " is not supported, expected " + str(VERSION))
+
+    locations = list(zip(arrays["food_y"].tolist(), arrays["food_x"].tolist()))
+    simulation = Simulation(tuple(meta["window"]), meta["cell_size"], 0, locations, meta["evo_and_learn"],
+                            meta["stochastic"], 0, meta["reproduce_time"], meta["grid_backend"], predator_count=0,
+                            verbose=verbose, seed=meta["seed"], telemetry=telemetry)
+    simulation.Time = meta["Time"]
+    simulation.Fish_eaten = meta["Fish_eaten"]
+    simulation.Fish_starved = meta["Fish_starved"]
+    simulation.death_age_total = meta["death_age_total"]
+
+    for i, foodpoint in enumerate(simulation.foodpoints):
+        for name in FOOD_FIELDS:
+            setattr(foodpoint, name, arrays["food_" + name][i].item())
+    simulation.foodpoints.invalidate()
+
+    # Fish are spawned with random state and then overwritten, the random draws do not matter as the streams' state is
+    # restored afterwards
+    fishes = simulation.fishes
+    n = len(arrays["fish_x"])
+    if n:
+        fishes.spawn_many(arrays["fish_colour"], arrays["fish_x"], arrays["fish_y"], arrays["fish_genes"])
+        for name in FishSchool.FIELDS:
+            getattr(fishes, name)[:n] = arrays["fish_" + name]
+    fishes.next_id = meta["next_id"]
+    fishes.reindex()
+
+    for i in range(len(arrays["predator_x"])):
+        predator = PredatorBoid(simulation.window, simulation.grid, simulation.random)
+        for name in PREDATOR_FIELDS:
+            setattr(predator, name, arrays["predator_" + name][i].item())
+        simulation.predators.append(predator)
+
+    # Put the entities back into the grid in the order they were saved in, so every query returns them in the same
+    # order. A grid that sizes itself gets back the cell size it had chosen
+    grid = simulation.grid
+    grid.resize(meta["grid_cell_size"])
+    entities = [fishes.fish[slot] if slot >= 0 else simulation.predators[-1 - slot]
+                for slot in arrays["grid_order"].tolist()]
+    for entity in entities:
+        grid.removeFish(entity)
+    for entity in entities:
+        grid.addFish(entity)
+    grid.rebuild()
+
+    oldest_slot = int(arrays["oldest_slot"])
+    if oldest_slot >= 0:
+        simulation.oldest_fish = fishes.fish[oldest_slot]
+    elif oldest_slot == -1:
+        # The oldest fish has died, it is brought back as a fish that no longer belongs to the school
+        oldest = SchoolFish(fishes, 0)
+        oldest._store = _SavedRecord(arrays)
+        oldest.school = None
+        simulation.oldest_fish = oldest
+    simulation.youngest_fish = fishes.youngest()
+
+    simulation.random.set_state(meta["random"], {name[len("noise_"):]: values for name, values in arrays.items()
+                                                 if name.startswith("noise_")})
+    return simulation
+
+
+# The saved record of a fish that had left the school, laid out like the record SchoolFish keeps when it is removed
+class _SavedRecord():
+    def __init__(self, arrays):
+        for name in FishSchool.FIELDS:
+            setattr(self, name, arrays["oldest_" + name].copy())
+
+
+# Saves a checkpoint every `every` ticks. Only one save is in flight at a time, a new one waits for the last to finish
+class Checkpointer():
+    def __init__(self, path, every=3600):
+        self.path = path
+        self.every = every
+        self.last_saved = None
+        self.thread = None
+
+    # Saves if at least `every` ticks have passed since the last checkpoint
+    def maybe_save(self, simulation):
+        if self.last_saved is None:
+            self.last_saved = simulation.Time
+        if simulation.Time - self.last_saved >= self.every:
+            self.save(simulation)
+
+    def save(self, simulation):
+        self.wait()
+        self.thread = save_checkpoint(simulation, self.path)
+        self.last_saved = simulation.Time
+
+    # Blocks until the checkpoint being written has finished
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -2,24 +2,47 @@ import math
 
 import numpy as np
 
-from PredatorBoid import PredatorBoid
+from FoodField import FoodField
+from PredatorBoid import PredatorBoid, camouflage
+from RandomStreams import RandomStreams
+from Vision import FLOCK_RADIUS, SEPARATION_RADIUS
+
+
+# The basic kite shape of a fish before it is rotated, length is the length of the fish
+def fish_kite(length=3):
+    return [[length, length],
+            [0, length * 2.5],
+            [-length, length],
+            [-length, length * 0.2],
+            [-length * 0.3, -length],
+            [-length * 1.2, -length * 2.5],
+            [0, -length * 2],
+            [length * 1.2, -length * 2.5],
+            [length * 0.3, -length],
+            [length, length * 0.2]
+            ]
 
 
 class FishBoid():
-    def __init__(self, window, colour, grid, foodpoints, evo_and_learn, stochastic,reproduce_time):
+    def __init__(self, window, colour, grid, foodpoints, evo_and_learn, stochastic,reproduce_time,random=None):
         self.colour = colour
+        self.camouflage = camouflage(colour)
         self.age = 0
+        # Every random draw of the fish comes from the simulation's streams, the starting state from the spawn stream
+        self.random = random if random is not None else RandomStreams()
+        spawn = self.random.spawn
         # Random starting position and starting velocity
-        self.x, self.y = np.random.uniform(0.1, 0.9) * window[1], np.random.uniform(0, 0.9) * window[0]
+        self.x, self.y = spawn.uniform(0.1, 0.9) * window[1], spawn.uniform(0, 0.9) * window[0]
 
-        self.Vx = np.random.uniform(-3, 3)
-        self.Vy = np.random.uniform(-3, 3)
+        self.Vx = spawn.uniform(-3, 3)
+        self.Vy = spawn.uniform(-3, 3)
 
         # A bug has caused the x, y-axis of the fish to be reversed, therefore this makes sure the fish are at the right
         # positions
         self.window = (window[1], window[0])
 
-        self.foodpoints = foodpoints
+        # The food points are kept as a FoodField, which knows the nearest active food point to every cell
+        self.foodpoints = FoodField.attach(grid, foodpoints)
         # Enables/disables these features based on initialising arguments
         self.evo_and_learn = evo_and_learn
         self.stochastic = stochastic
@@ -33,18 +56,18 @@ class FishBoid():
         # Each gene has a different range of values, as certain extreme values can cause the boids to break, therefore
         # limiting the range of values independently prevents this
         # This is used as the basis for Table 1 in the report
-        self.S_co = np.random.uniform(0.25, 3)  # Gene 1
-        self.A_co = np.random.uniform(0.001, 3)  # Gene 2
-        self.C_co = np.random.uniform(0.001, 1)  # Gene 3
-        self.f_strength = np.random.uniform(0.01, 5)  # Gene 4
-        self.p_strength = np.random.uniform(0.01, 5)  # Gene 5
-        self.Hungry_co = np.random.uniform(0.05, 0.95)  # Gene 6
+        self.S_co = spawn.uniform(0.25, 3)  # Gene 1
+        self.A_co = spawn.uniform(0.001, 3)  # Gene 2
+        self.C_co = spawn.uniform(0.001, 1)  # Gene 3
+        self.f_strength = spawn.uniform(0.01, 5)  # Gene 4
+        self.p_strength = spawn.uniform(0.01, 5)  # Gene 5
+        self.Hungry_co = spawn.uniform(0.05, 0.95)  # Gene 6
 
         self.grid = grid
 
 
         # Each fish starts with a random number of hunger, this is primarily to prevent fish all starving at once
-        self.Hunger = np.random.randint(1500, 1900)
+        self.Hunger = spawn.integers(1500, 1900)
 
         self.maxHunger = 1900
 
@@ -53,7 +76,7 @@ class FishBoid():
 
         # Number of ticks before a fish can reproduce, random initial value is to prevent all fish breeding at once
         self.reproduceTime = reproduce_time
-        self.reproduce_timer = np.random.randint(0, 300)
+        self.reproduce_timer = spawn.integers(0, 300)
 
         # The initially created fish are neither elders nor juveniles, these are changed to True in the simulate fucntion
         self.isJuvenile = False
@@ -86,25 +109,24 @@ class FishBoid():
 
     # Checks whether a fish is hungry, if so, adds a force pulling the fish towards the nearest food point
     def goToFood(self):
-        anyActiveFood = any([foodpoint.active for foodpoint in self.foodpoints])
-        if self.Hunger < self.Hungry_Level and anyActiveFood:
-            # Get foodpoint with the lowest Euclidean distance from the fish
-            foodpoints = [fp for fp in self.foodpoints if fp.active]
-            foodlist = [math.dist((self.y, self.x), (foodpoint.y, foodpoint.x)) for foodpoint in foodpoints]
-
-            closest_food = foodpoints[np.argmin(foodlist)]
+        if self.Hunger < self.Hungry_Level:
+            # Look up the nearest active food point to the fish's cell
+            closest_food = self.foodpoints.nearest_food(self.x, self.y)
+            if closest_food is None:
+                return
             dx = closest_food.x - self.x
             dy = closest_food.y - self.y
             if self.stochastic:
-                dx += np.random.normal(0, 5)
-                dy += np.random.normal(0, 5)
+                noise = self.random.normal("movement", 0, 5, 2)
+                dx += noise[0]
+                dy += noise[1]
 
             distance = math.sqrt(dx ** 2 + dy ** 2)
 
             self.Vx += self.f_strength * dx / distance
             self.Vy += self.f_strength * dy / distance
 
-    # Checks whether the fish is near to any other fish, if so, then reproduce with the first neighbouring fish
+    # Checks whether the fish is near to any other fish, if so, then reproduce with the closest one
     # It employs a tournament genetic algorithm, that crosses over the parents genes (with bias towards the eldest)
     # Mutation is added as a simple gaussian noise to each value, given the range of values for each gene differs
     # the amount of noise also differs
@@ -113,10 +135,10 @@ class FishBoid():
         if isinstance(partner, FishBoid) and partner is not self:
             baby_x = (self.x + partner.x) / 2
             baby_y = (self.y + partner.y) / 2
-            baby_colour = np.clip(np.uint8(np.mean((self.colour, partner.colour), 0)) + np.random.randint(-30, 30, 3),
-                                  0, 255)
+            baby_colour = np.clip(np.uint8(np.mean((self.colour, partner.colour), 0)) +
+                                  self.random.ga.integers(-30, 30, 3), 0, 255)
             baby_fish = FishBoid((self.window[1], self.window[0]), baby_colour, self.grid, self.foodpoints,
-                                 self.evo_and_learn, self.stochastic,self.reproduceTime)
+                                 self.evo_and_learn, self.stochastic,self.reproduceTime,self.random)
 
             baby_fish.x = baby_x
             baby_fish.y = baby_y
@@ -142,9 +164,9 @@ class FishBoid():
         old_x,old_y = self.x,self.y
         # Reduce hunger
         self.Hunger -= 1
-        # Find neighbours
-        neighbours = self.grid.get_neighbour(self, 2)
-        close_neighbours = self.grid.get_neighbour(self, 1)
+        # Find neighbours, one query gives everything within FLOCK_RADIUS and the close ones are picked out of it
+        neighbours = self.grid.neighbourhood(self, FLOCK_RADIUS)
+        close_neighbours = neighbours.within(SEPARATION_RADIUS)
 
         # If the fish is deemed juvenile, learn from fish deemed elder in fishlist
         if self.isJuvenile and self.evo_and_learn:
@@ -152,11 +174,12 @@ class FishBoid():
             for elder in elders:
                 self.learn(elder)
 
-        # If a neighbour is the predator, avoid the predator
-        predator_spotted = [fish for fish in neighbours if isinstance(fish, PredatorBoid)]
+        # If a neighbour is the predator, avoid the nearest one
+        predator_spotted = [(distance, fish) for fish, distance in zip(neighbours, neighbours.distance)
+                            if isinstance(fish, PredatorBoid)]
 
         if predator_spotted:
-            self.avoidPredator(predator_spotted[0])
+            self.avoidPredator(min(predator_spotted, key=lambda spotted: spotted[0])[1])
 
         # If the fish reproduce timer has reach the limit, the fish reproduces
         if self.reproduce_timer >= self.reproduceTime:
@@ -173,11 +196,12 @@ class FishBoid():
         self.Combining_Steers(neighbours, close_neighbours)
 
         if self.stochastic:
-            self.Vx += np.random.normal(0, 0.5)
-            self.Vy += np.random.normal(0, 0.5)
+            noise = self.random.normal("movement", 0, 0.5, 2)
+            self.Vx += noise[0]
+            self.Vy += noise[1]
 
         # Normalizes the speed and caps it at the speed limit
-        self.speed_limit()
+        self.speed_limit(neighbours)
 
         # Transform position to vector
         self.x += self.Vx
@@ -200,19 +224,11 @@ class FishBoid():
         if not neighbours:
             return 0, 0
         else:
-            separation_force_x = 0
-            separation_force_y = 0
-            for fish in neighbours:
-                if isinstance(fish, FishBoid):
-                    # Weighing the separation value by the normalised distance from self to neighbour
-                    # so fish closer together have a stronger separation force
-                    dx = self.x - fish.x
-                    dy = self.y - fish.y
-                    distance_sq = np.sqrt(dx ** 2 + dy ** 2)
-                    if distance_sq > 0:
-                        separation_force_x += dx / distance_sq
-                        separation_force_y += dy / distance_sq
-            return separation_force_x, separation_force_y
+            # Weighing the separation value by the normalised distance from self to neighbour so fish closer together
+            # have a stronger separation force. The neighbourhood already has the offset and distance of each neighbour
+            push = neighbours.is_fish & (neighbours.distance > 0)
+            distance = neighbours.distance[push]
+            return -np.sum(neighbours.dx[push] / distance), -np.sum(neighbours.dy[push] / distance)
 
     # The paper defines cohesion as the force pushing fish to the centre of all its neighbours
     def Cohesion(self, neighbours):
@@ -256,9 +272,11 @@ class FishBoid():
         self.Vx += (self.C_co * cohesion[0] + self.S_co * separation[0] + self.A_co * alignment[0])
         self.Vy += (self.C_co * cohesion[1] + self.S_co * separation[1] + self.A_co * alignment[1])
 
-    # Normalise and limit speed of fish, giving a minor speed boost to fish in a flock
-    def speed_limit(self):
-        v_max = 2 if self.grid.count_flock(self) else 1.6
+    # Normalise and limit speed of fish, giving a minor speed boost to fish in a flock (more than 3 entities within
+    # FLOCK_RADIUS). The fish's neighbourhood is counted if it is given, instead of asking the grid again
+    def speed_limit(self, neighbours=None):
+        in_flock = len(neighbours) > 3 if neighbours is not None else self.grid.count_flock(self)
+        v_max = 2 if in_flock else 1.6
         v_min = 0.05
 
         vel_norm = np.sqrt(self.Vx ** 2 + self.Vy ** 2)
@@ -272,23 +290,11 @@ class FishBoid():
 
     # Create the shape of the fish, rotating it to match the direction of the fishes movement
     def draw_shape(self):
-        # Length of the fish
-        length = 3
         # Direction of movement
         direction = np.arctan2(self.Vy, self.Vx)
 
         # Create basic kite
-        kite = [[length, length],
-                [0, length * 2.5],
-                [-length, length],
-                [-length, length * 0.2],
-                [-length * 0.3, -length],
-                [-length * 1.2, -length * 2.5],
-                [0, -length * 2],
-                [length * 1.2, -length * 2.5],
-                [length * 0.3, -length],
-                [length, length * 0.2]
-                ]
+        kite = fish_kite()
 
         # Rotation matrix
         r_matrix = np.array([[np.cos(direction), -np.sin(direction)], [np.sin(direction), np.cos(direction)]])
@@ -323,14 +329,14 @@ class FishBoid():
         # The baby should inherit around 75% of the older fishes genes and 25% of the younger fish
         if self_index > partner_index:
             for i in range(len(self_geno)):
-                chance = np.random.random()
+                chance = self.random.ga.random()
                 if i > 0.25:
                     baby_geno.append(self_geno[i])
                 else:
                     baby_geno.append(partner_geno[i])
         else:
             for i in range(len(self_geno)):
-                chance = np.random.random()
+                chance = self.random.ga.random()
                 if i > 0.25:
                     baby_geno.append(partner_geno[i])
                 else:
@@ -340,12 +346,13 @@ class FishBoid():
     def mutate(self, baby_geno):
         # Creep mutation: add a small amount of noise to each gene, with gaussian distribution
         # As the range of values for each gene differs, the amount mutated also differs
-        baby_geno[0] += np.random.normal(0, 0.1)
-        baby_geno[1] += np.random.normal(0, 0.1)
-        baby_geno[2] += np.random.normal(0, 0.03)
-        baby_geno[3] += np.random.normal(0, 0.15)
-        baby_geno[4] += np.random.normal(0, 0.15)
-        baby_geno[5] += np.random.normal(0, 0.06)
+        ga = self.random.ga
+        baby_geno[0] += ga.normal(0, 0.1)
+        baby_geno[1] += ga.normal(0, 0.1)
+        baby_geno[2] += ga.normal(0, 0.03)
+        baby_geno[3] += ga.normal(0, 0.15)
+        baby_geno[4] += ga.normal(0, 0.15)
+        baby_geno[5] += ga.normal(0, 0.06)
 
     # Social learning, juvenile fish slowly align their genotype to nearby elders at a slow rate
     def learn(self, elder):
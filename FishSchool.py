@@ -0,0 +1,514 @@
+import numpy as np
+
+import BoidKernels
+from AgeIndex import AgeIndex
+from FishBoid import FishBoid
+from FoodField import FoodField
+from PredatorBoid import camouflage
+from RandomStreams import RandomStreams
+from Vision import FLOCK_RADIUS, PARTNER_RADIUS
+
+# Order of the genes in the genotype matrix, matching FishBoid's attributes
+GENES = ("S_co", "A_co", "C_co", "f_strength", "p_strength", "Hungry_co")
+# Range of the randomly drawn starting genes (FishBoid.__init__)
+GENE_MIN = (0.25, 0.001, 0.001, 0.01, 0.01, 0.05)
+GENE_MAX = (3, 3, 1, 5, 5, 0.95)
+# Standard deviation of the creep mutation of each gene (FishBoid.mutate) and the range genes are clipped to after it
+MUTATION = (0.1, 0.1, 0.03, 0.15, 0.15, 0.06)
+CLIP_MIN = (0.25, 0.0001, 0.0001, 0.0001, 0.0001, 0.0001)
+CLIP_MAX = (3, 3, 1, 5, 5, 0.95)
+# How far a juvenile's genes move towards an elder's each time it learns from one (FishBoid.learn)
+LEARNING_RATE = 0.0003
+
+
+# Property that reads/writes one field of a fish in its school's arrays
+def _array_property(name):
+    def get(fish):
+        return getattr(fish._store, name)[fish._index]
+
+    def set(fish, value):
+        getattr(fish._store, name)[fish._index] = value
+
+    return property(get, set)
+
+
+def _gene_property(gene):
+    def get(fish):
+        return fish._store.genes[fish._index, gene]
+
+    def set(fish, value):
+        fish._store.genes[fish._index, gene] = value
+
+    return property(get, set)
+
+
+# A FishBoid whose state lives in a FishSchool. It behaves like a normal FishBoid for the grid, predators, food points
+# and drawing, but the school steps all of its fish at once instead of calling update() on each one
+class SchoolFish(FishBoid):
+    x = _array_property("x")
+    y = _array_property("y")
+    Vx = _array_property("Vx")
+    Vy = _array_property("Vy")
+    Hunger = _array_property("Hunger")
+    Hungry_Level = _array_property("Hungry_Level")
+    age = _array_property("age")
+    reproduce_timer = _array_property("reproduce_timer")
+    camouflage = _array_property("camouflage")
+    isJuvenile = _array_property("isJuvenile")
+    isElder = _array_property("isElder")
+    fish_id = _array_property("fish_id")
+    S_co = _gene_property(0)
+    A_co = _gene_property(1)
+    C_co = _gene_property(2)
+    f_strength = _gene_property(3)
+    p_strength = _gene_property(4)
+    Hungry_co = _gene_property(5)
+
+    def __init__(self, school, index):
+        self._store = school
+        self._index = index
+        self.school = school
+        self.window = school.window
+        self.grid = school.grid
+        self.foodpoints = school.foodpoints
+        self.evo_and_learn = school.evo_and_learn
+        self.stochastic = school.stochastic
+        self.random = school.random
+        self.reproduceTime = school.reproduceTime
+        self.maxHunger = school.maxHunger
+
+    @property
+    def colour(self):
+        return tuple(int(channel) for channel in self._store.colour[self._index])
+
+    @colour.setter
+    def colour(self, value):
+        self._store.colour[self._index] = value
+        self.camouflage = camouflage(value)
+
+    # Once a fish leaves the school it keeps a copy of its final state, so anything still holding it can read it
+    def _detach(self):
+        self._store = _FishRecord(self._store, self._index)
+        self._index = 0
+        self.school = None
+
+    def update(self):
+        raise RuntimeError("Fish in a FishSchool are updated by FishSchool.step()")
+
+
+# The state of a single fish that has been removed from its school
+class _FishRecord():
+    def __init__(self, school, index):
+        for name in FishSchool.FIELDS:
+            setattr(self, name, getattr(school, name)[index:index + 1].copy())
+
+
+# Struct-of-arrays storage for every fish in a simulation. Each field is a contiguous numpy array and step() advances
+# the whole school in one batched update, following the same steps as FishBoid.update()
+class FishSchool():
+    FIELDS = ("x", "y", "Vx", "Vy", "Hunger", "Hungry_Level", "age", "reproduce_timer", "isJuvenile", "isElder",
+              "genes", "colour", "camouflage", "fish_id")
+
+    def __init__(self, window, grid, foodpoints, evo_and_learn, stochastic, reproduce_time, capacity=256, random=None):
+        # Same axis swap as FishBoid
+        self.window = (window[1], window[0])
+        self.grid = grid
+        self.foodpoints = FoodField.attach(grid, foodpoints)
+        self.evo_and_learn = evo_and_learn
+        self.stochastic = stochastic
+        self.reproduceTime = reproduce_time
+        self.maxHunger = 1900
+        # Every random draw of the school comes from the simulation's streams
+        self.random = random if random is not None else RandomStreams()
+
+        self.count = 0
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.Vx = np.zeros(capacity)
+        self.Vy = np.zeros(capacity)
+        self.Hunger = np.zeros(capacity, dtype=np.int64)
+        self.Hungry_Level = np.zeros(capacity)
+        self.age = np.zeros(capacity, dtype=np.int64)
+        self.reproduce_timer = np.zeros(capacity, dtype=np.int64)
+        self.isJuvenile = np.zeros(capacity, dtype=bool)
+        self.isElder = np.zeros(capacity, dtype=bool)
+        self.genes = np.zeros((capacity, len(GENES)))
+        self.colour = np.zeros((capacity, 3), dtype=np.int64)
+        self.camouflage = np.zeros(capacity)
+        # Every fish gets the next number when it is born. It never changes while the fish is alive, unlike its slot in
+        # the arrays, and it also gives the birth order
+        self.fish_id = np.zeros(capacity, dtype=np.int64)
+        self.next_id = 0
+        # Slot of each fish ID (-1 once it has died) and the age rank of the live IDs
+        self.slot_of = np.full(capacity, -1, dtype=np.int64)
+        self.ages = AgeIndex(capacity)
+        # Age class boundaries as fish IDs, from the last classify_ages(), None until it first runs
+        self.elder_cut = -1
+        self.juvenile_cut = None
+        self.classified_until = 0
+
+        # One view per live fish, in the same order as the arrays
+        self.fish = []
+        # Fish removed this tick, they leave the arrays when flush_removals() is called at the end of the tick
+        self.pending = set()
+
+        # StripPool that works out the boid forces on several processes, None to do everything in this one
+        self.strips = None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(list(self.fish))
+
+    def __getitem__(self, item):
+        return self.fish[item]
+
+    # Double the size of every array when the school runs out of room
+    def _grow(self, needed):
+        capacity = len(self.x)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in self.FIELDS:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    # Adds a fish with the same random starting state as a new FishBoid and returns its view
+    def spawn(self, colour, x=None, y=None, genotype=None):
+        return self.spawn_many([colour], None if x is None else [x], None if y is None else [y],
+                               None if genotype is None else [genotype])[0]
+
+    # Adds a batch of fish at once into the preallocated arrays and returns their views. Positions and genotypes are
+    # random unless they are given
+    def spawn_many(self, colours, x=None, y=None, genotypes=None):
+        m = len(colours)
+        self._grow(self.count + m)
+        new = slice(self.count, self.count + m)
+        spawn = self.random.spawn
+        self.x[new] = spawn.uniform(0.1, 0.9, m) * self.window[0]
+        self.y[new] = spawn.uniform(0, 0.9, m) * self.window[1]
+        self.Vx[new] = spawn.uniform(-3, 3, m)
+        self.Vy[new] = spawn.uniform(-3, 3, m)
+        self.genes[new] = spawn.uniform(GENE_MIN, GENE_MAX, (m, len(GENES)))
+        self.Hunger[new] = spawn.integers(1500, 1900, m)
+        # Like FishBoid, the hunger threshold is fixed from the randomly drawn gene, before any inherited genotype
+        self.Hungry_Level[new] = np.round(self.maxHunger * self.genes[new, 5])
+        self.reproduce_timer[new] = spawn.integers(0, 300, m)
+        self.age[new] = 0
+        self.isJuvenile[new] = False
+        self.isElder[new] = False
+        self.colour[new] = colours
+        self.camouflage[new] = [camouflage(colour) for colour in self.colour[new]]
+        if x is not None and y is not None:
+            self.x[new], self.y[new] = x, y
+        if genotypes is not None:
+            self.genes[new] = genotypes
+        fish_ids = np.arange(self.next_id, self.next_id + m)
+        self.fish_id[new] = fish_ids
+        self.next_id += m
+        self._index_ids(fish_ids, np.arange(new.start, new.stop))
+
+        fishes = [SchoolFish(self, i) for i in range(new.start, new.stop)]
+        self.count += m
+        self.fish.extend(fishes)
+        for fish in fishes:
+            self.grid.addFish(fish)
+        return fishes
+
+    # Takes fish out of the grid straight away, so nothing can find them for the rest of the tick. They stay in the
+    # arrays (and in len() and iteration) until flush_removals()
+    def remove(self, fishes):
+        for fish in fishes:
+            if fish.school is self and fish not in self.pending:
+                self.grid.removeFish(fish)
+                self.pending.add(fish)
+
+    # Removes the fish passed to remove() since the last flush. Each hole is filled with one of the last fish in the
+    # arrays, so the cost is the number of removed fish rather than the size of the school. The last fish fills the
+    # lowest hole, the one before it the next hole and so on, so the slot order after a flush is always the same
+    def flush_removals(self):
+        if not self.pending:
+            return
+        holes = np.array(sorted(fish._index for fish in self.pending), dtype=np.int64)
+        for fish in self.pending:
+            fish._detach()
+        self.pending = set()
+        dead = self.fish_id[holes]
+        self.slot_of[dead] = -1
+        self.ages.remove(dead)
+
+        count = self.count - len(holes)
+        targets = holes[holes < count]
+        tail = np.ones(self.count - count, dtype=bool)
+        tail[holes[holes >= count] - count] = False
+        movers = (np.flatnonzero(tail) + count)[::-1]
+        for name in self.FIELDS:
+            array = getattr(self, name)
+            array[targets] = array[movers]
+        for target, mover in zip(targets.tolist(), movers.tolist()):
+            self.fish[target] = self.fish[mover]
+            self.fish[target]._index = target
+        self.slot_of[self.fish_id[targets]] = targets
+        del self.fish[count:]
+        self.count = count
+
+    # Records the slots of newly added fish IDs and adds them to the age index
+    def _index_ids(self, fish_ids, slots):
+        if len(fish_ids) == 0:
+            return
+        needed = int(fish_ids.max()) + 1
+        if needed > len(self.slot_of):
+            slot_of = np.full(max(needed, len(self.slot_of) * 2), -1, dtype=np.int64)
+            slot_of[:len(self.slot_of)] = self.slot_of
+            self.slot_of = slot_of
+        self.slot_of[fish_ids] = slots
+        self.ages.add(fish_ids)
+
+    # Rebuilds the ID lookups from the fish_id array, after it has been written directly (loading a checkpoint). The
+    # age classes are worked out from scratch at the next classify_ages()
+    def reindex(self):
+        self.slot_of = np.full(max(self.next_id, 1), -1, dtype=np.int64)
+        self.ages = AgeIndex(max(self.next_id, 1))
+        self._index_ids(self.fish_id[:self.count], np.arange(self.count))
+        self.juvenile_cut = None
+
+    # Marks the oldest 10% of the school as elders and the youngest 20% as juveniles, ranked by birth order from the
+    # age index. Only the fish whose class changed are touched: those between the old and new boundaries and the fish
+    # born since the last call. Like the original simulate loop, elders stay elders
+    def classify_ages(self):
+        n = self.count
+        if n == 0:
+            return
+        elder_count = n // 10
+        elder_cut = self.ages.kth(elder_count) if elder_count else -1
+        juvenile_cut = self.ages.kth(int(n * 0.8) + 1)
+
+        if self.juvenile_cut is None:
+            ids = self.fish_id[:n]
+            self.isJuvenile[:n] = ids >= juvenile_cut
+            self.isElder[:n] |= ids <= elder_cut
+        else:
+            if elder_cut > self.elder_cut:
+                self._flag(self.isElder, self.elder_cut + 1, elder_cut + 1, True)
+            if juvenile_cut > self.juvenile_cut:
+                self._flag(self.isJuvenile, self.juvenile_cut, juvenile_cut, False)
+            elif juvenile_cut < self.juvenile_cut:
+                self._flag(self.isJuvenile, juvenile_cut, self.juvenile_cut, True)
+            self._flag(self.isJuvenile, max(juvenile_cut, self.classified_until), self.next_id, True)
+        self.elder_cut = max(elder_cut, self.elder_cut)
+        self.juvenile_cut = juvenile_cut
+        self.classified_until = self.next_id
+
+    # Sets a flag for the live fish with IDs in [first, last)
+    def _flag(self, flags, first, last, value):
+        slots = self.slot_of[first:last]
+        flags[slots[slots >= 0]] = value
+
+    # The fish born first and the fish born last, None if the school is empty
+    def oldest(self):
+        return self.fish[self.slot_of[self.ages.oldest()]] if self.count else None
+
+    def youngest(self):
+        return self.fish[self.slot_of[self.ages.youngest()]] if self.count else None
+
+    # The fish that have run out of food
+    def starved(self):
+        return [self.fish[i] for i in np.flatnonzero(self.Hunger[:self.count] <= 0)]
+
+    # Advances every fish by one tick. Neighbour state is read from the start of the tick, and fish born this tick are
+    # added after everyone has moved
+    def step(self, predators=()):
+        n = self.count
+        if n == 0:
+            return
+        grid = self.grid
+        x, y = self.x[:n], self.y[:n]
+        genes = self.genes[:n]
+
+        self.Hunger[:n] -= 1
+
+        # Find neighbours within FLOCK_RADIUS, same as FishBoid.update. The pairs of the whole school are only listed
+        # when the boid forces are worked out from them here
+        row, column = BoidKernels.cell_coords(x, y, grid.cell_size, grid.rows, grid.columns)
+        order, start = BoidKernels.bin_cells(row, column, grid.rows, grid.columns)
+        use_strips = self.strips is not None and n >= self.strips.min_fish
+        pairs = None
+        if not (BoidKernels.COMPILED or use_strips):
+            pairs = BoidKernels.radius_pairs(x, y, row, column, x, y, order, start, grid.rows, grid.columns,
+                                             grid.cell_size, FLOCK_RADIUS)
+
+        # Juveniles learn from every elder in their neighbourhood, in neighbour order. Only juveniles learn, so unless
+        # the school's pairs are already known only the juveniles' neighbourhoods are listed (in the same order)
+        if self.evo_and_learn:
+            if pairs is not None:
+                owners, members = pairs[:2]
+            else:
+                juveniles = np.flatnonzero(self.isJuvenile[:n])
+                owners, members = BoidKernels.radius_pairs(x[juveniles], y[juveniles], row[juveniles],
+                                                           column[juveniles], x, y, order, start, grid.rows,
+                                                           grid.columns, grid.cell_size, FLOCK_RADIUS)[:2]
+                owners = juveniles[owners]
+            learning = self.isJuvenile[owners] & self.isElder[members]
+            learn_from_elders(genes, owners[learning], members[learning])
+
+        # Find the nearest predator within FLOCK_RADIUS of each fish, and how many predators it can see
+        predator_count = np.zeros(n)
+        predator_first = np.full(n, -1)
+        first_key = np.full(n, np.inf)
+        for p, predator in enumerate(predators):
+            distance_sq = (x - predator.x) ** 2 + (y - predator.y) ** 2
+            seen = distance_sq <= FLOCK_RADIUS ** 2
+            predator_count += seen
+            key = np.where(seen, distance_sq, np.inf)
+            closer = key < first_key
+            first_key[closer] = key[closer]
+            predator_first[closer] = p
+        Vx, Vy = self.Vx[:n].copy(), self.Vy[:n].copy()
+        start_Vx, start_Vy = Vx.copy(), Vy.copy()
+        for p, predator in enumerate(predators):
+            chased = predator_first == p
+            Vx[chased] += genes[chased, 4] * (x[chased] - predator.x)
+            Vy[chased] += genes[chased, 4] * (y[chased] - predator.y)
+
+        # Reproduce once the timer has run out, the babies are added once every fish has moved
+        timer = self.reproduce_timer[:n]
+        ready = np.flatnonzero(timer >= self.reproduceTime)
+        timer += 1
+        timer[ready] = 0
+        births = self._breed(ready, row, column, order, start)
+
+        Vx, Vy = self._go_to_food(Vx, Vy)
+        Vx, Vy = BoidKernels.avoid_edge(x, y, Vx, Vy, self.window)
+
+        # The alignment sum includes the fish itself, whose velocity has already been changed this tick
+        if use_strips:
+            cohesion, separation, alignment, count = self.strips.neighbour_forces(x, y, start_Vx, start_Vy, grid)
+        else:
+            cohesion, separation, alignment, count = BoidKernels.neighbour_forces(x, y, start_Vx, start_Vy, row,
+                                                                                  column, order, start, grid.rows,
+                                                                                  grid.columns, grid.cell_size, pairs)
+        self_seen = 1 / (count + 0.00000001)
+        alignment = (alignment[0] + (Vx - start_Vx) * self_seen, alignment[1] + (Vy - start_Vy) * self_seen)
+        # Non-fish neighbours do not add to the boid forces, but a fish with any neighbours still steers
+        has_neighbours = (count + predator_count) > 0
+        Vx += has_neighbours * (genes[:, 2] * cohesion[0] + genes[:, 0] * separation[0] + genes[:, 1] * alignment[0])
+        Vy += has_neighbours * (genes[:, 2] * cohesion[1] + genes[:, 0] * separation[1] + genes[:, 1] * alignment[1])
+
+        if self.stochastic:
+            noise = self.random.normal("movement", 0, 0.5, 2 * n)
+            Vx += noise[:n]
+            Vy += noise[n:]
+
+        # Fish in a flock (more than 3 entities within FLOCK_RADIUS pixels) get a minor speed boost
+        v_max = np.where(count + predator_count > 3, 2, 1.6)
+        Vx, Vy = BoidKernels.speed_limit(Vx, Vy, v_max)
+        self.Vx[:n], self.Vy[:n] = Vx, Vy
+
+        padding = 20
+        x += Vx
+        y += Vy
+        np.clip(x, padding, self.window[0] - padding, out=x)
+        np.clip(y, padding, self.window[1] - padding, out=y)
+
+        # Only fish that changed cell need to move in the grid, they are all moved in one call
+        new_row, new_column = BoidKernels.cell_coords(x, y, grid.cell_size, grid.rows, grid.columns)
+        moved = np.flatnonzero((new_row != row) | (new_column != column))
+        grid.moveFishes(self.fish, moved, new_row[moved], new_column[moved])
+
+        self.age[:n] += 1
+
+        if births is not None:
+            self.spawn_many(*births)
+
+    # Pull hungry fish towards their nearest active food point (FishBoid.goToFood), looked up from the food field
+    def _go_to_food(self, Vx, Vy):
+        n = self.count
+        hungry = np.flatnonzero(self.Hunger[:n] < self.Hungry_Level[:n])
+        if len(hungry) == 0:
+            return Vx, Vy
+        x, y = self.x[hungry], self.y[hungry]
+        closest = self.foodpoints.nearest_index(x, y)
+        if not self.foodpoints.any_active:
+            return Vx, Vy
+        dx = self.foodpoints.food_x[closest] - x
+        dy = self.foodpoints.food_y[closest] - y
+        if self.stochastic:
+            noise = self.random.normal("movement", 0, 5, 2 * len(hungry))
+            dx += noise[:len(hungry)]
+            dy += noise[len(hungry):]
+        distance = np.sqrt(dx ** 2 + dy ** 2)
+        f_strength = self.genes[hungry, 3]
+        Vx[hungry] += f_strength * dx / distance
+        Vy[hungry] += f_strength * dy / distance
+        return Vx, Vy
+
+    # Matches every fish that is ready to reproduce with a partner in one batched query, and works out all of the
+    # babies at once. The partner is the nearest other fish within PARTNER_RADIUS, like Grid.getPartner.
+    # Returns the colours, positions and genotypes of the babies, or None if no fish found a partner
+    def _breed(self, ready, row, column, order, start):
+        if len(ready) == 0:
+            return None
+        grid = self.grid
+        owners, members, distance_sq = BoidKernels.radius_pairs(self.x[ready], self.y[ready], row[ready],
+                                                                column[ready], self.x, self.y, order, start, grid.rows,
+                                                                grid.columns, grid.cell_size, PARTNER_RADIUS)
+        others = members != ready[owners]
+        owners, members, distance_sq = owners[others], members[others], distance_sq[others]
+        if len(owners) == 0:
+            return None
+        # Sort each owner's pairs by distance (ties keep the scan order), so the first pair of each owner is its
+        # partner
+        nearest = np.lexsort((np.arange(len(owners)), distance_sq, owners))
+        owners, members = owners[nearest], members[nearest]
+        first = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+        parents = ready[owners[first]]
+        partners = members[first]
+
+        baby_x = (self.x[parents] + self.x[partners]) / 2
+        baby_y = (self.y[parents] + self.y[partners]) / 2
+        mean_colour = ((self.colour[parents] + self.colour[partners]) / 2).astype(np.uint8).astype(np.int64)
+        baby_colours = np.clip(mean_colour + self.random.ga.integers(-30, 30, (len(parents), 3)), 0, 255)
+        genotypes = None
+        if self.evo_and_learn:
+            genotypes = tournament_ga(self.genes[parents], self.genes[partners], self.age[parents],
+                                      self.age[partners], self.random.ga)
+        return baby_colours, baby_x, baby_y, genotypes
+
+
+# FishBoid.learn for a batch of (juvenile, elder) pairs, grouped by juvenile in the order the juvenile learns from
+# them. Learning k times in a row has a closed form: with r = LEARNING_RATE, a juvenile that starts with genes g0 and
+# learns from elders e_1..e_k ends up with
+#     g_k = (1 - r)^k g0 + sum over m of r (1 - r)^(k - m) e_m
+# so every juvenile is updated at once. This matches the sequential calls (up to rounding) as long as no fish is both
+# learning and being learned from, which cannot happen unless an elder is also among the youngest 20%. In that case the
+# pairs are applied one by one
+def learn_from_elders(genes, juveniles, elders):
+    if len(juveniles) == 0:
+        return
+    if np.isin(elders, juveniles).any():
+        for juvenile, elder in zip(juveniles, elders):
+            genes[juvenile] += LEARNING_RATE * (genes[elder] - genes[juvenile])
+        return
+    learners, first, lessons = np.unique(juveniles, return_index=True, return_counts=True)
+    group = np.repeat(np.arange(len(learners)), lessons)
+    # Position of each pair within its juvenile's lessons, counted from 1
+    position = np.arange(len(juveniles)) - np.repeat(first, lessons) + 1
+    weight = LEARNING_RATE * (1 - LEARNING_RATE) ** (lessons[group] - position)
+    learned = np.stack([np.bincount(group, weight * genes[elders, gene], len(learners))
+                        for gene in range(genes.shape[1])], axis=1)
+    genes[learners] = (1 - LEARNING_RATE) ** lessons[:, None] * genes[learners] + learned
+
+
+# FishBoid.TournamentGA for a whole batch of parents: each row is one pair of parents. The baby takes genes 2-6 from
+# the older parent and gene 1 from the younger one (FishBoid.inherit), then creep mutation drawn from `generator` (the
+# simulation's ga stream) is added and the genes clipped
+def tournament_ga(parent_genes, partner_genes, parent_age, partner_age, generator):
+    parent_older = (parent_age > partner_age)[:, None]
+    baby = np.where(parent_older, parent_genes, partner_genes)
+    baby[:, 0] = np.where(parent_older[:, 0], partner_genes[:, 0], parent_genes[:, 0])
+    baby += generator.normal(0, MUTATION, baby.shape)
+    return np.clip(baby, CLIP_MIN, CLIP_MAX)
@@ -0,0 +1,86 @@
+import numpy as np
+
+# Size in pixels of the squares the nearest food point is looked up for. The field keeps its own squares rather than
+# using the grid's cells, so the grid's cell size does not change which food point a fish heads for
+FIELD_CELL = 15
+
+
+# The food points of a simulation, together with a cached lookup of the nearest active food point from every square of
+# the window (a Voronoi map of the active food points over the square centres). Food points only change when
+# FoodPoint.checkActive turns one on or off, which invalidates the map, so finding a hungry fish's food is one array
+# lookup however many food points there are. It can be used anywhere a list of food points is expected
+class FoodField():
+    def __init__(self, grid, foodpoints):
+        self.grid = grid
+        self.rows = max(int(grid.window[0] // FIELD_CELL), 1)
+        self.columns = max(int(grid.window[1] // FIELD_CELL), 1)
+        self.foodpoints = list(foodpoints)
+        for foodpoint in self.foodpoints:
+            foodpoint.field = self
+
+        self.food_x = np.array([foodpoint.x for foodpoint in self.foodpoints], dtype=float)
+        self.food_y = np.array([foodpoint.y for foodpoint in self.foodpoints], dtype=float)
+
+        # Index of the nearest active food point for each square, -1 when every food point is inactive
+        self.nearest = None
+        self.any_active = False
+        self.valid = False
+
+    # Returns the field for a list of food points, reusing the one they already belong to. This lets FishBoid be given
+    # a plain list of food points
+    @staticmethod
+    def attach(grid, foodpoints):
+        if isinstance(foodpoints, FoodField):
+            return foodpoints
+        field = getattr(foodpoints[0], "field", None) if foodpoints else None
+        if field is not None and field.foodpoints == list(foodpoints):
+            return field
+        return FoodField(grid, foodpoints)
+
+    def __iter__(self):
+        return iter(self.foodpoints)
+
+    def __len__(self):
+        return len(self.foodpoints)
+
+    def __getitem__(self, item):
+        return self.foodpoints[item]
+
+    # Called when a food point turns on or off
+    def invalidate(self):
+        self.valid = False
+
+    def _build(self):
+        active = np.array([foodpoint.active for foodpoint in self.foodpoints], dtype=bool)
+        self.any_active = bool(active.any())
+        if not self.any_active:
+            self.nearest = np.full((self.rows, self.columns), -1)
+        else:
+            # x runs along the columns and y along the rows, like Grid.cell_coords
+            centre_y = (np.arange(self.rows) + 0.5) * FIELD_CELL
+            centre_x = (np.arange(self.columns) + 0.5) * FIELD_CELL
+            # Keep a running minimum so memory stays at one value per square however many food points there are
+            closest = np.full((self.rows, self.columns), np.inf)
+            self.nearest = np.full((self.rows, self.columns), -1)
+            for i in np.flatnonzero(active):
+                distance = (centre_y[:, None] - self.food_y[i]) ** 2 + (centre_x[None, :] - self.food_x[i]) ** 2
+                closer = distance < closest
+                closest[closer] = distance[closer]
+                self.nearest[closer] = i
+        self.valid = True
+
+    # Index of the nearest active food point for each position, -1 if there are none. Works on arrays of positions
+    def nearest_index(self, x, y):
+        if not self.valid:
+            self._build()
+        column = np.clip((np.asarray(x) / FIELD_CELL).astype(np.int64), 0, self.columns - 1)
+        row = np.clip((np.asarray(y) / FIELD_CELL).astype(np.int64), 0, self.rows - 1)
+        return self.nearest[row, column]
+
+    # The nearest active food point to a single position, or None if every food point is inactive
+    def nearest_food(self, x, y):
+        if not self.valid:
+            self._build()
+        if not self.any_active:
+            return None
+        return self.foodpoints[int(self.nearest_index(x, y))]
@@ -15,9 +15,17 @@ class FoodPoint():
         self.TimeOut = 2800
         self.size = size
 
-    #Feeds neighbouring fish ONLY if the fish are 'hungry' (below their respective hunger threshold)
+        #The FoodField this foodpoint belongs to, it is told whenever the foodpoint turns on or off
+        self.field = None
+
+    #Feeds fish within size pixels ONLY if the fish are 'hungry' (below their respective hunger threshold)
     def detectFish(self):
-        neighbours = self.grid.get_neighbour(self,self.size)
+        #Skip the neighbour search when the occupancy table shows no fish nearby
+        if not self.active or self.grid.density(self.x,self.y,self.size,fish_only=True) == 0:
+            self.checkActive()
+            return
+        #Fish sharing the food point's cell have usually scanned the same window already this tick
+        neighbours = self.grid.neighbourhood(self,self.size)
         for fish in neighbours:
             if self.active and isinstance(fish,FishBoid) and (fish.Hunger < fish.Hungry_Level):
                 self.capacity -= 1
@@ -30,12 +38,18 @@ class FoodPoint():
         if self.active and self.capacity <= 0:
             self.internalTime = 0
             self.active = False
+            self.changed()
         elif not self.active:
             self.internalTime += 1
         
             if self.internalTime >= self.TimeOut:
                 self.active = True
                 self.capacity = self.max_capacity
+                self.changed()
+
+    def changed(self):
+        if self.field is not None:
+            self.field.invalidate()
 
 
 
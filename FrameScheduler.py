@@ -0,0 +1,53 @@
+import time
+
+
+# Fixed-timestep scheduler for the render loop. The simulation advances at ticks_per_frame * target_fps ticks per
+# second of wall-clock time, however long a frame takes to draw: if drawing falls behind, the next frame steps extra
+# ticks to catch up (only the last state is drawn). If it falls so far behind that more than max_ticks_per_frame would
+# be due, the rest of the backlog is skipped so one slow frame cannot snowball.
+# A target_fps of 0 runs uncapped, stepping ticks_per_frame ticks every frame with no waiting
+class FrameScheduler():
+    def __init__(self, ticks_per_frame=1, target_fps=60, max_ticks_per_frame=None):
+        self.ticks_per_frame = ticks_per_frame
+        self.target_fps = target_fps
+        self.max_ticks_per_frame = max_ticks_per_frame or ticks_per_frame * 5
+
+        self.accumulator = 0.0
+        self.last_frame = None
+        self.next_frame = None
+
+        # Counters for how well the loop is keeping up
+        self.frames = 0
+        self.skipped_ticks = 0
+
+    # Number of ticks the simulation should step before the next frame is drawn
+    def ticks_due(self):
+        self.frames += 1
+        now = time.perf_counter()
+        if not self.target_fps or self.last_frame is None:
+            self.last_frame = now
+            return self.ticks_per_frame
+
+        self.accumulator += (now - self.last_frame) * self.ticks_per_frame * self.target_fps
+        self.last_frame = now
+        due = int(self.accumulator)
+        if due > self.max_ticks_per_frame:
+            self.skipped_ticks += due - self.max_ticks_per_frame
+            self.accumulator = 0.0
+            return self.max_ticks_per_frame
+        self.accumulator -= due
+        return due
+
+    # Sleeps until the next frame should start, keeping the frame rate at target_fps
+    def wait(self):
+        if not self.target_fps:
+            return
+        frame_time = 1 / self.target_fps
+        now = time.perf_counter()
+        if self.next_frame is None or now - self.next_frame > frame_time:
+            # First frame, or the loop has fallen behind by more than a frame, so restart the pacing from now
+            self.next_frame = now
+        self.next_frame += frame_time
+        delay = self.next_frame - now
+        if delay > 0:
+            time.sleep(delay)
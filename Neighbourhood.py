@@ -0,0 +1,64 @@
+import numpy as np
+
+
+# The entities in the window of cells around one cell, found in a single scan of the grid, along with their positions
+# and whether each is a fish. The window is wide enough for a query radius from anywhere in the cell, and queries pick
+# out the entities actually within their radius.
+# The grids cache one of these per cell and window size, so every fish in a cell and the food point over it share the
+# same scan. The list grid makes it again once anything in the window changes, the array grid at its next rebuild
+class CellNeighbours():
+    def __init__(self, entities, x, y, is_fish):
+        self.entities = entities
+        self.x = x
+        self.y = y
+        self.is_fish = is_fish
+
+    def __len__(self):
+        return len(self.entities)
+
+    # The entities within `radius` pixels of the point x,y, leaving out any entity in `hidden` (removed since the scan)
+    def around(self, x, y, radius, hidden=()):
+        dx = self.x - x
+        dy = self.y - y
+        distance = np.sqrt(dx ** 2 + dy ** 2)
+        keep = distance <= radius
+        if hidden:
+            keep &= np.array([entity not in hidden for entity in self.entities], dtype=bool)
+        entities = [entity for entity, inside in zip(self.entities, keep) if inside]
+        return Neighbourhood(entities, dx[keep], dy[keep], distance[keep], self.is_fish[keep])
+
+
+# The neighbours of one entity within a radius, in the order the grid scanned them, with the offset (dx, dy) from the
+# entity to each neighbour and their distance. It can be iterated over like a list of neighbours
+class Neighbourhood():
+    def __init__(self, entities, dx, dy, distance, is_fish):
+        self.entities = entities
+        self.dx = dx
+        self.dy = dy
+        self.distance = distance
+        self.is_fish = is_fish
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __iter__(self):
+        return iter(self.entities)
+
+    # The neighbours within a smaller radius, without another scan
+    def within(self, radius):
+        keep = self.distance <= radius
+        if keep.all():
+            return self
+        return Neighbourhood([entity for entity, inside in zip(self.entities, keep) if inside], self.dx[keep],
+                             self.dy[keep], self.distance[keep], self.is_fish[keep])
+
+    # The nearest fish other than `fish` itself, None if there is none. Fish at the same distance are told apart by the
+    # order they were found in
+    def closest_fish(self, fish):
+        best = None
+        best_distance = np.inf
+        for entity, distance, is_fish in zip(self.entities, self.distance, self.is_fish):
+            if is_fish and entity is not fish and distance < best_distance:
+                best = entity
+                best_distance = distance
+        return best
@@ -0,0 +1,30 @@
+import numpy as np
+
+
+# Per-tick count of the entities in every grid cell, stored as a summed-area table (integral image) so the number of
+# entities within k cells of any cell is four lookups, whatever k is. Two tables are kept: every entity (predators
+# included) and fish only
+class Occupancy():
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+        self.entities = np.zeros((rows + 1, columns + 1), dtype=np.int64)
+        self.fish = np.zeros((rows + 1, columns + 1), dtype=np.int64)
+        self.built = False
+
+    # Builds the tables from the number of entities and fish in each cell (rows x columns arrays)
+    def build(self, entity_counts, fish_counts):
+        for table, counts in ((self.entities, entity_counts), (self.fish, fish_counts)):
+            table[1:, 1:] = counts
+            np.cumsum(table, axis=0, out=table)
+            np.cumsum(table, axis=1, out=table)
+        self.built = True
+
+    # Number of entities (or fish only) in the window of k cells around (row, column). Works on single cells or arrays
+    def count(self, row, column, k, fish_only=False):
+        table = self.fish if fish_only else self.entities
+        top = np.clip(row - k, 0, self.rows)
+        bottom = np.clip(row + k + 1, 0, self.rows)
+        left = np.clip(column - k, 0, self.columns)
+        right = np.clip(column + k + 1, 0, self.columns)
+        return table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]
@@ -2,13 +2,58 @@ import math
 
 import numpy as np
 
+from RandomStreams import RandomStreams
+from Vision import PREDATOR_RADIUS
+
+# Colour of the water, fish with a similar colour are harder for the predator to spot
+WATER_COLOUR = (153, 238, 255)
+
+
+# How well a fish of this colour blends into the water, the higher the value the less likely the predator is to chase
+# it. This only depends on the colour, so it is worked out once when the fish is born
+def camouflage(colour):
+    return 255 - math.dist(WATER_COLOUR, colour)
+
+
+# The arrow shape of the predator before it is rotated, length is the size of the predator
+def predator_kite(length=20):
+    return [[-length * 0.8, length * 0.8],
+            [-length * 0.75, length],
+            [0, length * 1.15],
+            [length * 0.75, length],
+            [length * 0.8, length * 0.8],
+            [length * 0.3, length * 0.75],
+            [length * 0.35, length * 0.5],
+            [length * 0.4, 0],
+            [length * 0.6, -length * 0.25],
+            [length * 0.7, -length * 0.55],
+            [length * 0.4, -length * 0.25],
+            [length * 0.2, -length * 1],
+            [length * 0.1, -length * 1.5],
+            [length * 0.3, -length * 1.55],
+            [length * 0.4, -length * 1.7],
+            [0, -length * 1.6],
+            [-length * 0.4, -length * 1.7],
+            [-length * 0.3, -length * 1.55],
+            [-length * 0.1, -length * 1.5],
+            [-length * 0.2, -length * 1],
+            [-length * 0.4, -length * 0.25],
+            [-length * 0.7, -length * 0.55],
+            [-length * 0.6, -length * 0.25],
+            [-length * 0.4, 0],
+            [-length * 0.35, length * 0.5],
+            [-length * 0.3, length * 0.75],
+            ]
+
 
 class PredatorBoid():
-    def __init__(self, window, grid):
+    def __init__(self, window, grid, random=None):
         self.window = (window[1], window[0])
         self.grid = grid
+        # Random streams shared with the simulation, a predator on its own gets fresh ones
+        self.random = random if random is not None else RandomStreams()
 
-        self.x, self.y = np.random.uniform(0.1, 0.9) * window[1], np.random.uniform(0, 0.9) * window[0]
+        self.x, self.y = self.random.spawn.uniform(0.1, 0.9) * window[1], self.random.spawn.uniform(0, 0.9) * window[0]
         self.Vx = 1.6
         self.Vy = 1.6
 
@@ -18,23 +63,23 @@ class PredatorBoid():
         self.target = None  # Fish it wants to catch
         self.grid.addFish(self)
 
-    # Find the closest fish in a 12x12 cell radius, as well as the distance to this fish
+    # Find the closest fish within PREDATOR_RADIUS pixels, as well as the distance to this fish. Fish that blend into
+    # the water look further away, with some noise. Every candidate is scored at once
     def get_closest_fish(self):
-        all_visible_fish = self.grid.get_neighbour(self, vision_range=12)
-        closest_fish = None
-        value = float(1000)
-        min_distance = float(1000)
-        for fish in all_visible_fish:
-            if not isinstance(fish,PredatorBoid):
-
-                distance = math.dist((self.x, self.y), (fish.x, fish.y))
-                colour_dist = 255 - math.dist((153, 238, 255),fish.colour)
-                cur_val = distance + np.random.normal(0.5,0.2)*colour_dist
-                if cur_val < value:
-                    value = cur_val
-                    min_distance = distance
-                    closest_fish = fish
-        return closest_fish,min_distance
+        # Nothing to chase if the occupancy table shows no fish in the surrounding window
+        if self.grid.density(self.x, self.y, PREDATOR_RADIUS, fish_only=True) == 0:
+            return None, float(1000)
+        candidates, x, y, camouflage = self.grid.gather_in_radius(self, PREDATOR_RADIUS)
+        # Other predators (and this one) have no camouflage value, only the prey are scored and drawn noise for
+        prey = np.flatnonzero(~np.isnan(camouflage))
+        if not len(prey):
+            return None, float(1000)
+        distance = np.sqrt((x[prey] - self.x) ** 2 + (y[prey] - self.y) ** 2)
+        value = distance + self.random.normal("predator", 0.5, 0.2, len(prey)) * camouflage[prey]
+        best = int(np.argmin(value))
+        if value[best] >= 1000:
+            return None, float(1000)
+        return candidates[prey[best]], distance[best]
 
 
     # Chase the closest fish and eat it if predator is close enough
@@ -103,35 +148,7 @@ class PredatorBoid():
 
     # Draw arrow of the predator
     def draw_shape(self):
-        length = self.size
-        kite = [[-length * 0.8, length * 0.8],
-                         [-length * 0.75, length],
-                         [0, length * 1.15],
-                         [length * 0.75, length],
-                         [length * 0.8, length * 0.8],
-                         [length * 0.3, length * 0.75],
-                         [length * 0.35, length * 0.5],
-                         [length * 0.4, 0],
-                         [length * 0.6, -length * 0.25],
-                         [length * 0.7, -length * 0.55],
-                         [length * 0.4, -length * 0.25],
-                         [length * 0.2, -length * 1],
-                         [length * 0.1, -length * 1.5],
-                         [length * 0.3, -length * 1.55],
-                         [length * 0.4, -length * 1.7],
-                         [0, -length * 1.6],
-                         [-length * 0.4, -length * 1.7],
-                         [-length * 0.3, -length * 1.55],
-                         [-length * 0.1, -length * 1.5],
-                         [-length * 0.2, -length * 1],
-                         [-length * 0.4, -length * 0.25],
-                         [-length * 0.7, -length * 0.55],
-                         [-length * 0.6, -length * 0.25],
-                         [-length * 0.4, 0],
-                         [-length * 0.35, length * 0.5],
-                         [-length * 0.3, length * 0.75],
-
-                         ]
+        kite = predator_kite(self.size)
         direction = np.arctan2(self.Vy, self.Vx)
         # Rotation matrix
         r_matrix = np.array([[np.cos(direction), -np.sin(direction)], [np.sin(direction), np.cos(direction)]])
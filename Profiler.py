@@ -0,0 +1,157 @@
+import time
+
+import numpy as np
+
+# Phases of a tick (timed by Simulation.tick) and of a drawn frame (timed by Renderer.draw). "tick" is the whole tick
+TICK_PHASES = ("food", "fish", "starved", "grid", "predators", "tick")
+FRAME_PHASES = ("draw", "hud", "flip")
+PERCENTILES = (50, 95, 99)
+
+# Hot methods wrapped so far, by (owner, method): the original and the active profilers its calls are timed for. Each
+# method is wrapped once however many profilers are active, and put back when the last of them is closed
+_wrapped = {}
+
+
+# The hot methods that Simulation.tick runs, as (name, owner, method), the owner being a class or a module. The food
+# points use neighbourhood, the school's step runs the boid forces (on this process or the strip pool), the food pull
+# and breeding, and the predators gather their prey. They are wrapped only while a Profiler is active
+def hot_methods():
+    import BoidKernels
+    from ArrayGrid import ArrayGrid
+    from BoidGrid import Grid
+    from FishSchool import FishSchool
+    from PredatorBoid import PredatorBoid
+    from StripPool import StripPool
+    return (("neighbourhood", Grid, "neighbourhood"), ("neighbourhood", ArrayGrid, "neighbourhood"),
+            ("neighbour_forces", BoidKernels, "neighbour_forces"), ("neighbour_forces", StripPool, "neighbour_forces"),
+            ("go_to_food", FishSchool, "_go_to_food"), ("breed", FishSchool, "_breed"),
+            ("gather_in_radius", Grid, "gather_in_radius"), ("gather_in_radius", ArrayGrid, "gather_in_radius"),
+            ("get_closest_fish", PredatorBoid, "get_closest_fish"))
+
+
+# Stand-in used when profiling is off, every hook does nothing
+class NullProfiler():
+    enabled = False
+
+    def begin_tick(self):
+        pass
+
+    def mark(self):
+        pass
+
+    def lap(self, name):
+        pass
+
+    def end_tick(self, tick):
+        pass
+
+    def close(self):
+        pass
+
+
+# Times each phase of the tick and of drawing, and the hot methods of the grid, school and predators. The last `window`
+# samples of every timer are kept in a ring buffer, and every dump_every ticks their p50/p95/p99 (in milliseconds) and
+# the number of hot method calls since the last dump are written to the "profile" stream of the telemetry.
+# Hot methods are timed by wrapping them on their classes while the profiler is active, close() puts them back. The
+# wrapping is shared, so a second profiler in the same process does not time the calls twice (but both see every call)
+class Profiler():
+    enabled = True
+
+    def __init__(self, telemetry=None, dump_every=600, window=600):
+        self.telemetry = telemetry
+        self.dump_every = dump_every
+        self.window = window
+
+        methods = hot_methods()
+        self.method_names = tuple(dict.fromkeys(name for name, owner, method in methods))
+        self.names = TICK_PHASES + FRAME_PHASES + self.method_names
+        self.samples = {name: np.zeros(window) for name in self.names}
+        self.recorded = dict.fromkeys(self.names, 0)
+        # Time spent and number of calls in each hot method during the current tick, and calls since the last dump
+        self.pending = dict.fromkeys(self.method_names, 0.0)
+        self.calls = dict.fromkeys(self.method_names, 0)
+
+        self.tick_started = self.last = time.perf_counter()
+
+        if telemetry is not None:
+            columns = ["tick"]
+            for name in self.names:
+                columns.extend(name + "_p" + str(percentile) for percentile in PERCENTILES)
+            columns.extend(name + "_calls" for name in self.method_names)
+            telemetry.add_stream("profile", columns)
+
+        self.patched = []
+        for name, owner, method in methods:
+            self._wrap(name, owner, method)
+
+    def _wrap(self, name, owner, method):
+        key = (owner, method)
+        if key not in _wrapped:
+            original = owner.__dict__[method]
+            profilers = []
+
+            def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - started
+                    for profiler in profilers:
+                        profiler.pending[name] += elapsed
+                        profiler.calls[name] += 1
+
+            setattr(owner, method, timed)
+            _wrapped[key] = (original, profilers)
+        _wrapped[key][1].append(self)
+        self.patched.append(key)
+
+    def _add(self, name, seconds):
+        self.samples[name][self.recorded[name] % self.window] = seconds
+        self.recorded[name] += 1
+
+    def begin_tick(self):
+        self.tick_started = self.last = time.perf_counter()
+
+    # Starts timing from now, the next lap is measured from here
+    def mark(self):
+        self.last = time.perf_counter()
+
+    # Records the time since the last mark or lap as one sample of the phase
+    def lap(self, name):
+        now = time.perf_counter()
+        self._add(name, now - self.last)
+        self.last = now
+
+    def end_tick(self, tick):
+        self._add("tick", time.perf_counter() - self.tick_started)
+        for name in self.method_names:
+            self._add(name, self.pending[name])
+            self.pending[name] = 0.0
+        if self.telemetry is not None and tick % self.dump_every == 0:
+            self.dump(tick)
+
+    # p50, p95 and p99 of a timer over its recorded window, in milliseconds (nan before anything was recorded)
+    def percentiles(self, name):
+        count = min(self.recorded[name], self.window)
+        if not count:
+            return (float("nan"),) * len(PERCENTILES)
+        return tuple(np.percentile(self.samples[name][:count], PERCENTILES) * 1000)
+
+    def dump(self, tick):
+        row = [tick]
+        for name in self.names:
+            row.extend(self.percentiles(name))
+        row.extend(self.calls[name] for name in self.method_names)
+        self.telemetry.record("profile", row)
+        for name in self.method_names:
+            self.calls[name] = 0
+
+    # Stops timing the hot methods, the originals are put back once no other profiler is using them
+    def close(self):
+        for key in reversed(self.patched):
+            original, profilers = _wrapped[key]
+            profilers.remove(self)
+            if not profilers:
+                setattr(key[0], key[1], original)
+                del _wrapped[key]
+        self.patched = []
@@ -0,0 +1,63 @@
+import numpy as np
+
+# Independent streams of random numbers, one per part of the simulation, so a change in how much randomness one part
+# uses does not shift the numbers every other part sees.
+# movement: stochastic swimming noise and food-seeking noise, ga: baby colours and mutation, predator: the predator's
+# view of camouflage, spawn: starting state of new fish and predators
+SUBSTREAMS = ("movement", "ga", "predator", "spawn")
+# Streams whose normal noise is drawn ahead of time in blocks
+NOISE_STREAMS = ("movement", "predator")
+
+
+# Standard normal values drawn from a generator a block at a time and handed out in order
+class NoiseBlock():
+    def __init__(self, generator, block_size):
+        self.generator = generator
+        self.block_size = block_size
+        self.values = np.zeros(0)
+        self.used = 0
+
+    # The next n values, a new block is drawn when the current one runs out
+    def take(self, n):
+        if self.used + n > len(self.values):
+            leftover = self.values[self.used:]
+            fresh = self.generator.standard_normal(max(self.block_size, n - len(leftover)))
+            self.values = np.concatenate((leftover, fresh))
+            self.used = 0
+        values = self.values[self.used:self.used + n]
+        self.used += n
+        return values
+
+
+# Every random number in a run comes from here. The run's seed is split with a SeedSequence into one
+# numpy.random.Generator per substream, and the hot paths take their normal noise in bulk from pre-drawn blocks.
+# The full state (generators and unused noise) can be saved and restored, so a resumed run draws the same numbers.
+# Without a seed, fresh entropy is used and kept in self.seed, so any run can be repeated
+class RandomStreams():
+    def __init__(self, seed=None, block_size=65536):
+        sequence = np.random.SeedSequence(seed)
+        self.seed = sequence.entropy
+        self.generators = {name: np.random.Generator(np.random.PCG64(child))
+                           for name, child in zip(SUBSTREAMS, sequence.spawn(len(SUBSTREAMS)))}
+        self.movement = self.generators["movement"]
+        self.ga = self.generators["ga"]
+        self.predator = self.generators["predator"]
+        self.spawn = self.generators["spawn"]
+        self.noise = {name: NoiseBlock(self.generators[name], block_size) for name in NOISE_STREAMS}
+
+    # n normal values with the given mean and standard deviation, taken from a stream's noise block
+    def normal(self, stream, loc, scale, n):
+        return loc + scale * self.noise[stream].take(n)
+
+    # The state of every generator (plain values that can be written as JSON) and the unused noise of each block
+    def get_state(self):
+        generators = {name: generator.bit_generator.state for name, generator in self.generators.items()}
+        noise = {name: block.values[block.used:].copy() for name, block in self.noise.items()}
+        return generators, noise
+
+    def set_state(self, generators, noise):
+        for name, state in generators.items():
+            self.generators[name].bit_generator.state = state
+        for name, values in noise.items():
+            self.noise[name].values = np.asarray(values, dtype=float).copy()
+            self.noise[name].used = 0
@@ -0,0 +1,204 @@
+import pygame
+from pygame import freetype
+
+from FishBoid import fish_kite
+from PredatorBoid import predator_kite
+from SpriteCache import SpriteCache
+
+BACKGROUND = (153, 238, 255)
+TEXT_COLOUR = (250, 250, 250)
+# Timers shown by the profiling overlay, and how many frames it waits between refreshes
+PROFILE_OVERLAY = ("tick", "food", "fish", "predators", "draw", "flip")
+PROFILE_REFRESH = 30
+
+
+# One line of HUD text. The text surface is only rendered again when the text changes
+class HudText():
+    def __init__(self, font, position):
+        self.font = font
+        self.position = position
+        self.text = None
+        self.surface = None
+        self.rect = None
+        # Area covered by the previous text, which has to be pushed to the display when the text changes
+        self.old_rect = None
+
+    # Returns True if the text changed
+    def set(self, text):
+        if text == self.text:
+            return False
+        self.text = text
+        self.old_rect = self.rect
+        if text is None:
+            self.surface = None
+            self.rect = None
+        else:
+            self.surface = self.font.render(text, TEXT_COLOUR)[0]
+            self.rect = self.surface.get_rect(topleft=self.position)
+        return True
+
+
+# Draws a Simulation in a pygame window. The simulation does not know about the renderer, so the same run can be
+# stepped without a display and only attached to a window when it needs to be watched.
+# Only the parts of the window that changed are redrawn: the water and food points are kept on a background surface,
+# last frame's sprites are erased by copying the background back over them, and only those rectangles, the new sprites
+# and any HUD lines whose text changed are pushed to the display
+class Renderer():
+    def __init__(self, simulation, sim_name, headings=64, max_sprites=4096, dirty_rects=True, show_profile=True):
+        self.simulation = simulation
+        pygame.init()
+        pygame.display.set_caption(str(sim_name))
+        self.screen = pygame.display.set_mode(simulation.window)
+
+        self.sprites = SpriteCache(headings, max_sprites)
+        self.fish_kite = fish_kite()
+        self.predator_kite = predator_kite()
+
+        # With dirty_rects off, the whole window is pushed to the display every frame
+        self.dirty_rects = dirty_rects
+        self.background = pygame.Surface(simulation.window)
+        self.food_state = None
+        # Rectangles of the sprites drawn last frame
+        self.drawn = []
+        self.first_frame = True
+
+        # The font is only created once, and each HUD line keeps its rendered text until the text changes
+        font = freetype.Font(None, 25)
+        self.hud = {name: HudText(font, position) for name, position in
+                    (("fish", (10, 10)), ("eaten", (10, 60)), ("starved", (10, 110)), ("genes", (10, 180)),
+                     ("age", (10, 220)), ("oldest_generation", (10, 260)), ("youngest_generation", (10, 300)),
+                     ("time", (10, 340)))}
+
+        # Drawing is timed by the simulation's profiler. When profiling is on, the percentiles of the main timers are
+        # shown under the HUD, refreshed every PROFILE_REFRESH frames so the text stays readable
+        self.profiler = simulation.profiler
+        self.show_profile = show_profile and self.profiler.enabled
+        self.frames = 0
+        if self.show_profile:
+            for i, name in enumerate(PROFILE_OVERLAY):
+                self.hud["profile_" + name] = HudText(font, (10, 400 + 30 * i))
+
+    # Returns False once the x button of the window has been pressed
+    def handle_events(self):
+        running = True
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+        return running
+
+    # Rectangle covered by a food point
+    def food_rect(self, foodpoint):
+        length = foodpoint.size * 4
+        top_left_x = foodpoint.x - length / 2
+        top_left_y = foodpoint.y - length / 2
+        return pygame.Rect(top_left_y, top_left_x, length, length)
+
+    # Draws the water and food points, food points are green while they have food and turn red when they are inactive
+    def draw_background(self):
+        self.background.fill(BACKGROUND)
+        for foodpoint in self.simulation.foodpoints:
+            if foodpoint.active:
+                colour = (0, 140, 0)
+            else:
+                colour = (140, 0, 0)
+            pygame.draw.rect(self.background, colour, self.food_rect(foodpoint))
+            pygame.draw.circle(self.background, (0, 0, 0), (int(foodpoint.y), int(foodpoint.x)), 3)
+
+    def draw(self):
+        simulation = self.simulation
+        screen = self.screen
+        profiler = self.profiler
+        profiler.mark()
+        self.frames += 1
+        dirty = []
+
+        # The background only changes when a food point turns on or off
+        food_state = [foodpoint.active for foodpoint in simulation.foodpoints]
+        if food_state != self.food_state:
+            self.draw_background()
+            for i, foodpoint in enumerate(simulation.foodpoints):
+                if self.food_state is None or food_state[i] != self.food_state[i]:
+                    rect = self.food_rect(foodpoint)
+                    screen.blit(self.background, rect, rect)
+                    dirty.append(rect)
+            self.food_state = food_state
+        if self.first_frame:
+            screen.blit(self.background, (0, 0))
+
+        # Erase last frame's sprites and HUD text by copying the background over them
+        for rect in self.drawn:
+            screen.blit(self.background, rect, rect)
+        for line in self.hud.values():
+            if line.rect is not None:
+                screen.blit(self.background, line.rect, line.rect)
+
+        # Fish and predators are drawn from pre-rotated sprites, the headings of the whole school are bucketed at once
+        fishes = simulation.fishes
+        n = len(fishes)
+        buckets = self.sprites.bucket(fishes.Vx[:n], fishes.Vy[:n]).tolist()
+        colours = fishes.colour[:n].tolist()
+        blits = []
+        for bucket, colour, x, y in zip(buckets, colours, fishes.x[:n].tolist(), fishes.y[:n].tolist()):
+            surface, (offset_x, offset_y) = self.sprites.sprite("fish", self.fish_kite, bucket, tuple(colour))
+            blits.append((surface, (int(y) + offset_x, int(x) + offset_y)))
+
+        for predator in simulation.predators:
+            bucket = int(self.sprites.bucket(predator.Vx, predator.Vy))
+            surface, (offset_x, offset_y) = self.sprites.sprite("predator", self.predator_kite, bucket,
+                                                                (108, 119, 128), (0, 0, 0))
+            blits.append((surface, (int(predator.y) + offset_x, int(predator.x) + offset_y)))
+        drawn = screen.blits(blits)
+
+        dirty.extend(self.drawn)
+        dirty.extend(drawn)
+        self.drawn = drawn
+        profiler.lap("draw")
+
+        dirty.extend(self.draw_hud())
+        profiler.lap("hud")
+
+        if self.first_frame or not self.dirty_rects:
+            pygame.display.update()
+            self.first_frame = False
+        else:
+            pygame.display.update(dirty)
+        profiler.lap("flip")
+
+    # Visually show stats about the state of the simulation, returns the areas of the lines that changed
+    def draw_hud(self):
+        simulation = self.simulation
+        oldest_fish = simulation.oldest_fish
+        youngest_fish = simulation.youngest_fish
+        text = {"fish": 'Number of Fish: ' + str(len(simulation.fishes)),
+                "eaten": 'Number of Fish Eaten: ' + str(simulation.Fish_eaten),
+                "starved": 'Number of Fish Starved: ' + str(simulation.Fish_starved),
+                "genes": None, "age": None, "oldest_generation": None, "youngest_generation": None,
+                # Time is every 60 ticks, the seconds of simulated time at the default 60 ticks per second. It only
+                # keeps up with the clock while the FrameScheduler can catch up on slow frames: once more than
+                # max_ticks_per_frame ticks are due, the rest are dropped and simulated time falls behind
+                "time": 'Time: ' + str(simulation.Time // 60)}
+        if oldest_fish is not None:
+            text["genes"] = 'Oldest fish\'s genes: ' + str(simulation.oldest_genes())
+            text["age"] = 'Oldest fish\'s age: ' + str(oldest_fish.age // 60)
+            text["oldest_generation"] = 'Oldest fish\'s generation: ~' + str(simulation.generation(oldest_fish))
+            text["youngest_generation"] = 'Youngest fish\'s generation: ~' + str(simulation.generation(youngest_fish))
+        if self.show_profile:
+            for name in PROFILE_OVERLAY:
+                if self.frames % PROFILE_REFRESH == 1 or self.hud["profile_" + name].text is None:
+                    p50, p95, p99 = self.profiler.percentiles(name)
+                    text["profile_" + name] = (name + ' p50/p95/p99: ' + str(round(p50, 2)) + ' / ' +
+                                               str(round(p95, 2)) + ' / ' + str(round(p99, 2)) + ' ms')
+                else:
+                    text["profile_" + name] = self.hud["profile_" + name].text
+
+        # The old text was already erased with the sprites, so every line is blitted again on top of the new sprites
+        dirty = []
+        for name, line in self.hud.items():
+            if line.set(text[name]):
+                dirty.extend(rect for rect in (line.old_rect, line.rect) if rect is not None)
+            if line.surface is not None:
+                self.screen.blit(line.surface, line.rect)
+        return dirty
+
+    def close(self):
+        pygame.quit()
@@ -0,0 +1,220 @@
+import time
+
+import numpy as np
+
+import BoidKernels
+from BoidGrid import create_grid
+from FishBoid import FishBoid
+from FishSchool import GENES, FishSchool
+from FoodField import FoodField
+from FoodPoint import FoodPoint
+from PredatorBoid import PredatorBoid
+from Profiler import NullProfiler
+from RandomStreams import RandomStreams
+from StripPool import StripPool
+from Telemetry import EATEN, STARVED
+from Vision import FOOD_RADIUS
+
+
+# Create a random RGB value, drawn from a numpy Generator
+def randomColour(generator):
+    return tuple(generator.integers(0, 255, 3).tolist())
+
+
+# The five food points used by the parameter menu: one near each corner and one in the middle of the screen
+def default_foodpoints(screen_size):
+    return [(screen_size[0] // 6, screen_size[1] // 6), (screen_size[0] // 6, screen_size[1] * 5 // 6),
+            (screen_size[0] * 5 // 6, screen_size[1] // 6),
+            (screen_size[0] * 5 // 6, screen_size[1] * 5 // 6),
+            (screen_size[0] // 2, screen_size[1] // 2)]
+
+
+# Owns everything in one run of the simulation (grid, fish, predators and food points) and advances it tick by tick.
+# It does not use pygame, so it can run without a display at whatever speed the CPU allows. Renderer.py draws it.
+# Everything looks a fixed number of pixels around it (Vision.py), so what each fish, predator and food point can see
+# does not depend on cell_size. The order neighbours are found in does, and with it which prey gets which predator
+# noise draw, the order food points feed fish and the rounding of the boid sums, so runs with the same seed but a
+# different cell size or grid backend follow different paths. With a cell_size of None the grid chooses its own
+class Simulation():
+    def __init__(self, window, cell_size, fish_count, foodpoint_locations, evo_and_learn, stochastic, food_quantity,
+                 reproduce_time, grid_backend="list", predator_count=2, verbose=True, seed=None, telemetry=None,
+                 profiler=None, step_workers=0):
+        # Every random draw of the run comes from these streams. Seeding them makes the starting population and every
+        # later draw repeatable, an unseeded run keeps the seed it was given so it can be repeated too
+        self.random = RandomStreams(seed)
+        self.seed = self.random.seed
+        self.window = window
+        self.cell_size = cell_size
+        self.evo_and_learn = evo_and_learn
+        self.stochastic = stochastic
+        # Prints a line for every death, like the original simulate loop
+        self.verbose = verbose
+        # Deaths and population snapshots are streamed to the Telemetry, if one is given
+        self.telemetry = telemetry
+        # Times the phases of each tick, the NullProfiler does nothing
+        self.profiler = profiler if profiler is not None else NullProfiler()
+
+        # Compiles the boid kernels now if Numba is installed, so the first ticks are not held up
+        BoidKernels.warmup()
+
+        self.grid_backend = grid_backend
+        self.grid = create_grid(window, cell_size, grid_backend)
+
+        # Food points are created at the points specified above, the amount of food and size of the food point can be
+        # changed. In this case the foodpoint feeds fish within FOOD_RADIUS pixels. The FoodField keeps the nearest
+        # active food point to every part of the window, so any number of food points can be used
+        self.foodpoints = FoodField(self.grid, [FoodPoint(foodpoint[1], foodpoint[0], self.grid, food_quantity,
+                                                          FOOD_RADIUS) for foodpoint in foodpoint_locations])
+
+        # Creates a school of fish with random colours, the school stores every fish in arrays and updates them all at
+        # once
+        self.fishes = FishSchool(window, self.grid, self.foodpoints, evo_and_learn, stochastic, reproduce_time,
+                                 capacity=max(fish_count, 1), random=self.random)
+        self.fishes.spawn_many(self.random.spawn.integers(0, 255, (fish_count, 3)))
+        # With more than one step worker, the boid forces of large schools are split into strips of the grid and
+        # worked out on a pool of processes. Only the force pass is split, everything else in the tick stays on this
+        # process. The result is the same either way
+        if step_workers > 1:
+            self.fishes.strips = StripPool(step_workers)
+        self.predators = [PredatorBoid(window, self.grid, self.random) for i in range(predator_count)]
+        # Give grid object the fish list reference, allowing it to remove fish from grid that are dead
+        self.grid.giveFishList(self.fishes)
+        # A grid that sizes itself picks the cell size for the starting population straight away
+        if self.grid.auto:
+            self.grid.rebuild()
+
+        self.Fish_eaten = 0
+        self.Fish_starved = 0
+        self.Time = 0
+
+        self.oldest_fish = None
+        self.youngest_fish = None
+
+        # Sum of the ages (in units of 60 ticks) of every fish that died, the deaths themselves go to the telemetry
+        self.death_age_total = 0
+
+    # Stops the step workers, if there are any
+    def close(self):
+        if self.fishes.strips is not None:
+            self.fishes.strips.close()
+            self.fishes.strips = None
+
+    # The simulation is over once every fish has died
+    @property
+    def finished(self):
+        return not self.fishes
+
+    # Advances the simulation by n ticks, stopping early if every fish dies
+    def step(self, n=1):
+        for i in range(n):
+            if self.finished:
+                return
+            self.tick()
+
+    # Runs without a display until every fish has died or the tick or wall-clock budget (in seconds) is used up.
+    # A Checkpointer can be given to save the run as it goes. Returns the summary of the run
+    def run(self, max_ticks=None, max_seconds=None, chunk=100, checkpointer=None):
+        started = time.perf_counter()
+        while not self.finished:
+            n = chunk if max_ticks is None else min(chunk, max_ticks - self.Time)
+            if n <= 0:
+                break
+            self.step(n)
+            if checkpointer is not None:
+                checkpointer.maybe_save(self)
+            if max_seconds is not None and time.perf_counter() - started >= max_seconds:
+                break
+        summary = self.summary()
+        summary["seconds"] = round(time.perf_counter() - started, 3)
+        return summary
+
+    # The main statistics of the run so far, as a flat dictionary
+    def summary(self):
+        n = len(self.fishes)
+        genes = self.fishes.genes[:n].mean(axis=0) if n else np.full(6, np.nan)
+        deaths = self.Fish_eaten + self.Fish_starved
+        summary = {"ticks": self.Time,
+                   "fish_alive": n,
+                   "fish_eaten": self.Fish_eaten,
+                   "fish_starved": self.Fish_starved,
+                   "mean_age_at_death": self.death_age_total / deaths if deaths else float("nan"),
+                   "oldest_age": self.oldest_fish.age // 60 if self.oldest_fish is not None else 0}
+        for name, value in zip(GENES, genes):
+            summary["mean_" + name] = float(value)
+        return summary
+
+    def tick(self):
+        profiler = self.profiler
+        profiler.begin_tick()
+        self.Time += 1
+        fishes = self.fishes
+
+        # Top 10% eldest fish considered "elders", they will teach the juvenile fish. Youngest 20% of fish considered
+        # "juveniles", they will learn from the elders. The school keeps an age index, so only fish whose class changed
+        # are updated
+        fishes.classify_ages()
+
+        # Update the foodpoints, feeding fish in their radius
+        for foodpoint in self.foodpoints:
+            foodpoint.detectFish()
+        profiler.lap("food")
+
+        # Update the fishes, if the fish runs out of hunger, it is removed
+        fishes.step(self.predators)
+        profiler.lap("fish")
+        starved = fishes.starved()
+        for fish in starved:
+            if self.verbose:
+                print("Fish Starved")
+            self.Fish_starved += 1
+            generation = ((self.Time - fish.age // 60) // 2700)
+            self.record_death(generation, fish.age // 60, STARVED, fish.fish_id)
+        fishes.remove(starved)
+        profiler.lap("starved")
+        self.grid.rebuild()
+        profiler.lap("grid")
+
+        # Update the predator, returns the fish it has eaten, or none if it did not eat in that tick
+        for predator in self.predators:
+            Eaten_fish = predator.update()
+            if isinstance(Eaten_fish, FishBoid) and Eaten_fish.school is fishes:
+                if self.verbose:
+                    print("Fish Eaten")
+                self.Fish_eaten += 1
+                generation = ((self.Time - Eaten_fish.age) // 2700)
+                self.record_death(generation, Eaten_fish.age // 60, EATEN, Eaten_fish.fish_id)
+                fishes.remove([Eaten_fish])
+        profiler.lap("predators")
+
+        # Dead fish were taken out of the grid straight away, they leave the school's arrays now the tick is over
+        fishes.flush_removals()
+
+        # Finds the youngest and fish that has lived the longest
+        if fishes:
+            # This checks whether the current oldest fish is older than the previous eldest fish
+            oldest = fishes.oldest()
+            if self.oldest_fish is None or oldest.age > self.oldest_fish.age:
+                self.oldest_fish = oldest
+            self.youngest_fish = fishes.youngest()
+
+        if self.telemetry is not None:
+            self.telemetry.tick(self)
+        profiler.end_tick(self.Time)
+
+    # Adds a death to the running totals and the telemetry, cause is Telemetry.STARVED or Telemetry.EATEN
+    def record_death(self, generation, age, cause, fish_id=-1):
+        self.death_age_total += int(age)
+        if self.telemetry is not None:
+            self.telemetry.record_death(self.Time, generation, age, cause, fish_id)
+
+    # The genotype of the oldest fish, rounded for display
+    def oldest_genes(self):
+        if self.oldest_fish is None:
+            return []
+        fish = self.oldest_fish
+        return [str(np.round(gene, 2)) for gene in
+                (fish.S_co, fish.A_co, fish.C_co, fish.f_strength, fish.p_strength, fish.Hungry_co)]
+
+    # Approximate generation of a fish, each generation lasts around 2700 ticks
+    def generation(self, fish):
+        return (self.Time - fish.age) // 2700
@@ -0,0 +1,57 @@
+from collections import OrderedDict
+
+import numpy as np
+import pygame
+
+
+# Renderer-side cache of pre-rotated fish and predator sprites. Headings are rounded to one of `headings` angle
+# buckets, the rotated outline of each shape is worked out once per bucket, and the filled surface is drawn once per
+# (shape, bucket, colour). Fish colours are inherited with noise so there can be many of them, so the surfaces are kept
+# in an LRU cache of at most max_sprites entries. Drawing an entity is then a dictionary lookup and a blit
+class SpriteCache():
+    def __init__(self, headings=64, max_sprites=4096):
+        self.headings = headings
+        self.max_sprites = max_sprites
+        # (shape name, bucket) -> outline points relative to the entity position
+        self.outlines = {}
+        # (shape name, bucket, colour, outline colour) -> (surface, blit offset)
+        self.sprites = OrderedDict()
+
+    # The heading bucket of each velocity, works on single values or whole arrays
+    def bucket(self, Vx, Vy):
+        direction = np.arctan2(Vy, Vx)
+        return np.round(direction / (2 * np.pi) * self.headings).astype(np.int64) % self.headings
+
+    # The kite rotated to the bucket's heading, the same rotation as FishBoid.draw_shape
+    def outline(self, name, kite, bucket):
+        key = (name, bucket)
+        points = self.outlines.get(key)
+        if points is None:
+            direction = bucket * 2 * np.pi / self.headings
+            r_matrix = np.array([[np.cos(direction), -np.sin(direction)], [np.sin(direction), np.cos(direction)]])
+            points = np.dot(kite, r_matrix)
+            self.outlines[key] = points
+        return points
+
+    # Surface with the rotated shape drawn on it, and the offset to blit it at relative to the entity position
+    def sprite(self, name, kite, bucket, colour, outline_colour=None):
+        key = (name, bucket, colour, outline_colour)
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.sprites.move_to_end(key)
+            return sprite
+
+        points = self.outline(name, kite, bucket)
+        corner = np.floor(points.min(axis=0)) - 1
+        size = np.ceil(points.max(axis=0) - corner) + 2
+        surface = pygame.Surface((int(size[0]), int(size[1])), pygame.SRCALPHA)
+        local = [(point[0], point[1]) for point in points - corner]
+        pygame.draw.polygon(surface, colour, local)
+        if outline_colour is not None:
+            pygame.draw.polygon(surface, outline_colour, local, width=1)
+        sprite = (surface, (int(corner[0]), int(corner[1])))
+
+        self.sprites[key] = sprite
+        if len(self.sprites) > self.max_sprites:
+            self.sprites.popitem(last=False)
+        return sprite
@@ -0,0 +1,128 @@
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import BoidKernels
+from Vision import FLOCK_RADIUS, reach
+
+# Arrays the coordinator writes each tick and the forces the workers write back (cohesion x/y, separation x/y,
+# alignment x/y and neighbour count)
+INPUTS = ("x", "y", "Vx", "Vy")
+OUTPUTS = 7
+
+# Shared memory blocks a worker has attached to, by name
+_attached = {}
+
+
+def _block(name):
+    block = _attached.get(name)
+    if block is None:
+        # Pool workers share the coordinator's resource tracker, so the coordinator stays in charge of unlinking it
+        block = shared_memory.SharedMemory(name=name)
+        _attached[name] = block
+    return block
+
+
+# Forgets blocks from before the coordinator last grew its buffers
+def _forget_except(names):
+    for name in list(_attached):
+        if name not in names:
+            _attached.pop(name).close()
+
+
+def _start_worker():
+    BoidKernels.warmup()
+
+
+# Worker side: the boid forces of the fish whose row is in [first_row, last_row). Only the fish in the strip and the
+# rows around it that are within FLOCK_RADIUS are binned, in slot order, so every cell lists its fish in the same order
+# as a single-process step and the sums come out identical
+def _strip_forces(task):
+    input_name, output_name, capacity, n, first_row, last_row, cell_size, rows, columns = task
+    _forget_except((input_name, output_name))
+    inputs = np.ndarray((len(INPUTS), capacity), dtype=float, buffer=_block(input_name).buf)
+    outputs = np.ndarray((OUTPUTS, capacity), dtype=float, buffer=_block(output_name).buf)
+    x, y, Vx, Vy = inputs[:, :n]
+
+    row, column = BoidKernels.cell_coords(x, y, cell_size, rows, columns)
+    halo = reach(FLOCK_RADIUS, cell_size)
+    local = np.flatnonzero((row >= first_row - halo) & (row < last_row + halo))
+    local_row, local_column = row[local], column[local]
+    order, start = BoidKernels.bin_cells(local_row, local_column, rows, columns)
+    cohesion, separation, alignment, count = BoidKernels.neighbour_forces(x[local], y[local], Vx[local], Vy[local],
+                                                                          local_row, local_column, order, start,
+                                                                          rows, columns, cell_size)
+    owned = (local_row >= first_row) & (local_row < last_row)
+    for i, force in enumerate((cohesion[0], cohesion[1], separation[0], separation[1], alignment[0], alignment[1],
+                               count)):
+        outputs[i, local[owned]] = force[owned]
+    return int(owned.sum())
+
+
+# Splits the grid into horizontal strips of rows and works out the boid forces of each strip on its own worker
+# process. The strips are worked out from the grid every tick, so they follow it if it changes its cell size.
+# Positions and velocities are copied into shared memory once per tick and the workers write their forces straight into
+# a shared output array, so nothing is pickled but the strip bounds.
+# The workers only compute forces, which depend on nothing random. Everything else in a tick (learning, predators,
+# births, deaths and kills) stays on the coordinator in slot order, so a run is the same whatever the number of workers
+class StripPool():
+    def __init__(self, workers, min_fish=2000):
+        self.workers = workers
+        # Below this many fish a single process is faster than handing the work out
+        self.min_fish = min_fish
+        # The resource tracker is started before the workers so they share it, and blocks they attach to are only
+        # tracked once
+        resource_tracker.ensure_running()
+        self.pool = multiprocessing.Pool(workers, initializer=_start_worker)
+        self.capacity = 0
+        self.inputs = None
+        self.outputs = None
+        self.blocks = []
+
+    # Makes the shared arrays big enough for `needed` fish, doubling like FishSchool does
+    def _reserve(self, needed):
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, self.capacity * 2, 1024)
+        self._release()
+        input_block = shared_memory.SharedMemory(create=True, size=len(INPUTS) * capacity * 8)
+        output_block = shared_memory.SharedMemory(create=True, size=OUTPUTS * capacity * 8)
+        self.blocks = [input_block, output_block]
+        self.inputs = np.ndarray((len(INPUTS), capacity), dtype=float, buffer=input_block.buf)
+        self.outputs = np.ndarray((OUTPUTS, capacity), dtype=float, buffer=output_block.buf)
+        self.capacity = capacity
+
+    def _release(self):
+        self.inputs = None
+        self.outputs = None
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    # The (first_row, last_row) of each strip of the grid
+    def strips(self, rows):
+        bounds = np.linspace(0, rows, self.workers + 1).astype(int)
+        return [(int(bounds[i]), int(bounds[i + 1])) for i in range(self.workers) if bounds[i] < bounds[i + 1]]
+
+    # Same result as BoidKernels.neighbour_forces for the whole school, computed strip by strip
+    def neighbour_forces(self, x, y, Vx, Vy, grid):
+        n = len(x)
+        self._reserve(n)
+        for i, values in enumerate((x, y, Vx, Vy)):
+            self.inputs[i, :n] = values
+        tasks = [(self.blocks[0].name, self.blocks[1].name, self.capacity, n, first_row, last_row, grid.cell_size,
+                  grid.rows, grid.columns) for first_row, last_row in self.strips(grid.rows)]
+        owned = sum(self.pool.map(_strip_forces, tasks))
+        if owned != n:
+            raise RuntimeError("Strips covered " + str(owned) + " of " + str(n) + " fish")
+        forces = self.outputs[:, :n].copy()
+        return (forces[0], forces[1]), (forces[2], forces[3]), (forces[4], forces[5]), forces[6]
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        self._release()
@@ -0,0 +1,168 @@
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from FishSchool import GENES
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Columns of the built-in streams. Death causes are coded as numbers so every column is numeric
+STARVED = 0
+EATEN = 1
+DEATH_COLUMNS = ("tick", "fish_id", "generation", "age", "cause")
+POPULATION_COLUMNS = ("tick", "fish", "eaten", "starved") + tuple("mean_" + gene for gene in GENES)
+
+
+# A fixed-size block of rows for one stream, full blocks are handed to the writer thread and a new one is started
+class _Chunk():
+    def __init__(self, columns, size):
+        self.columns = columns
+        self.rows = np.empty((size, len(columns)))
+        self.used = 0
+
+    def full(self):
+        return self.used == len(self.rows)
+
+
+# Streams what happens during a run to disk instead of keeping it in memory. Rows are buffered in fixed-size chunks per
+# stream and a background thread appends them to one file per stream, so memory stays the same however long the run
+# is. Chunks are handed over when they fill, and every hand_off_every seconds even if they have not, so slow streams
+# such as the population snapshots reach disk while the run is still going and a crash loses only the last few seconds.
+# Streams are written as CSV, or as a directory of Parquet files (one per chunk handed over) when pyarrow is installed
+class Telemetry():
+    def __init__(self, path, chunk_size=4096, snapshot_every=600, file_format="auto", hand_off_every=10.0):
+        if file_format == "auto":
+            file_format = "parquet" if pyarrow is not None else "csv"
+        if file_format not in ("csv", "parquet"):
+            raise ValueError("Unknown telemetry format: " + str(file_format))
+        if file_format == "parquet" and pyarrow is None:
+            raise RuntimeError("Writing Parquet telemetry needs pyarrow")
+        self.path = path
+        self.file_format = file_format
+        self.chunk_size = chunk_size
+        # Ticks between population snapshots
+        self.snapshot_every = snapshot_every
+        self.hand_off_every = hand_off_every
+        self.handed_off = time.monotonic()
+        os.makedirs(path, exist_ok=True)
+
+        self.streams = {}
+        self.parts = {}
+        self.queue = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self._write_chunks, daemon=True)
+        self.thread.start()
+
+        self.add_stream("deaths", DEATH_COLUMNS)
+        self.add_stream("population", POPULATION_COLUMNS)
+
+    # Starts a new stream of rows with the given column names
+    def add_stream(self, name, columns):
+        if name in self.streams:
+            raise ValueError("Telemetry stream " + name + " already exists")
+        self.streams[name] = _Chunk(tuple(columns), self.chunk_size)
+        self.parts[name] = 0
+
+    # Where a stream is written, a CSV file or a directory of Parquet files
+    def file(self, name):
+        if self.file_format == "csv":
+            return os.path.join(self.path, name + ".csv")
+        return os.path.join(self.path, name)
+
+    # Adds one row (a value for each column of the stream)
+    def record(self, name, row):
+        chunk = self.streams[name]
+        chunk.rows[chunk.used] = row
+        chunk.used += 1
+        if chunk.full():
+            self._hand_off(name)
+
+    def record_death(self, tick, generation, age, cause, fish_id=-1):
+        self.record("deaths", (tick, fish_id, generation, age, cause))
+
+    # Called once per tick by the simulation, takes a population snapshot every snapshot_every ticks and hands the
+    # partly filled chunks to the writer thread once hand_off_every seconds have passed
+    def tick(self, simulation):
+        if simulation.Time % self.snapshot_every == 0:
+            fishes = simulation.fishes
+            n = len(fishes)
+            genes = fishes.genes[:n].mean(axis=0) if n else np.full(len(GENES), np.nan)
+            self.record("population",
+                        (simulation.Time, n, simulation.Fish_eaten, simulation.Fish_starved) + tuple(genes))
+        if time.monotonic() - self.handed_off >= self.hand_off_every:
+            for name in self.streams:
+                self._hand_off(name)
+            self.handed_off = time.monotonic()
+
+    # Passes the rows buffered so far in a stream to the writer thread
+    def _hand_off(self, name):
+        chunk = self.streams[name]
+        if chunk.used:
+            self.queue.put((name, chunk.columns, chunk.rows[:chunk.used]))
+            self.streams[name] = _Chunk(chunk.columns, self.chunk_size)
+        if self.error is not None:
+            raise RuntimeError("Writing telemetry failed") from self.error
+
+    # Writes everything recorded so far and waits until it is on disk
+    def flush(self):
+        for name in self.streams:
+            self._hand_off(name)
+        self.queue.join()
+        if self.error is not None:
+            raise RuntimeError("Writing telemetry failed") from self.error
+
+    # Flushes and stops the writer thread
+    def close(self):
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+
+    def _write_chunks(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                if self.error is None:
+                    self._write(*item)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    def _write(self, name, columns, rows):
+        if self.file_format == "csv":
+            file_name = self.file(name)
+            new_file = not os.path.exists(file_name)
+            with open(file_name, "a") as file:
+                np.savetxt(file, rows, fmt="%.10g", delimiter=",", header=",".join(columns) if new_file else "",
+                           comments="")
+        else:
+            directory = self.file(name)
+            os.makedirs(directory, exist_ok=True)
+            # Each chunk is its own file, so the ones already written can be read while the run goes on
+            while True:
+                file_name = os.path.join(directory, "part-" + str(self.parts[name]).zfill(6) + ".parquet")
+                self.parts[name] += 1
+                if not os.path.exists(file_name):
+                    break
+            table = pyarrow.table({column: rows[:, i] for i, column in enumerate(columns)})
+            pyarrow.parquet.write_table(table, file_name)
+
+    # Reads a stream written so far as a pandas DataFrame
+    def read(self, name):
+        import pandas as pd
+        if self.file_format == "csv":
+            if not os.path.exists(self.file(name)):
+                return pd.DataFrame(columns=list(self.streams[name].columns))
+            return pd.read_csv(self.file(name))
+        if not os.path.isdir(self.file(name)):
+            return pd.DataFrame(columns=list(self.streams[name].columns))
+        return pd.read_parquet(self.file(name))
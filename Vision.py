@@ -0,0 +1,33 @@
+import math
+
+# How far everything in the simulation looks, in pixels. These used to be numbers of grid cells, so changing the cell
+# size changed what the fish could see. The values are what those cell counts covered at the default cell size of 15
+FLOCK_RADIUS = 30  # cohesion, alignment, learning from elders and spotting predators (was 2 cells)
+SEPARATION_RADIUS = 15  # separation (was 1 cell)
+PARTNER_RADIUS = 45  # looking for a partner to reproduce with (was 3 cells)
+PREDATOR_RADIUS = 180  # the predator looking for prey (was 12 cells)
+FOOD_RADIUS = 30  # how far a food point feeds hungry fish (was 2 cells)
+LARGEST_RADIUS = max(FLOCK_RADIUS, SEPARATION_RADIUS, PARTNER_RADIUS, PREDATOR_RADIUS, FOOD_RADIUS)
+
+# Automatic cell size: aim for about PER_CELL entities per cell, never go below MIN_CELL_SIZE pixels, and only change
+# size once the best size has moved by more than RETUNE_FACTOR, so a population that hovers around a boundary does not
+# make the grid resize every tick
+PER_CELL = 2
+MIN_CELL_SIZE = 5
+RETUNE_FACTOR = 1.25
+
+
+# Number of cells either side of a cell that can hold something within `radius` pixels of a point in it
+def reach(radius, cell_size):
+    return int(math.ceil(radius / cell_size))
+
+
+# The cell size for `count` entities spread over the window. The largest radius always spans a whole number of cells,
+# so the biggest query covers exactly its window of cells. With a current size, it is kept unless the best size has
+# moved far enough from it
+def tuned_cell_size(window, count, current=None):
+    ideal = math.sqrt(window[0] * window[1] * PER_CELL / max(count, 1))
+    if current is not None and abs(math.log(ideal / current)) < math.log(RETUNE_FACTOR):
+        return current
+    cells = min(max(1, round(LARGEST_RADIUS / ideal)), int(LARGEST_RADIUS // MIN_CELL_SIZE))
+    return LARGEST_RADIUS / cells
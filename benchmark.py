@@ -0,0 +1,217 @@
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+import BoidKernels
+from BoidGrid import create_grid
+from FishBoid import FishBoid
+from FoodPoint import FoodPoint
+from PredatorBoid import PredatorBoid
+from RandomStreams import RandomStreams
+from Simulation import Simulation, default_foodpoints, randomColour
+from Vision import FLOCK_RADIUS, FOOD_RADIUS, SEPARATION_RADIUS
+
+# Reproduction is pushed past the end of every benchmark so the population stays at the size being measured
+NO_REPRODUCTION = 10 ** 9
+
+
+# Best wall-clock time of `repeats` runs of function(), each run gets a fresh state from setup() and is handed to
+# teardown() afterwards (neither is timed)
+def best_time(function, setup=lambda: None, repeats=3, teardown=lambda state: None):
+    best = float("inf")
+    for i in range(repeats):
+        state = setup()
+        started = time.perf_counter()
+        function(state)
+        best = min(best, time.perf_counter() - started)
+        teardown(state)
+    return best
+
+
+# A cell size from the command line, "auto" lets the grid choose its own (None)
+def cell_size_arg(value):
+    return None if value == "auto" else int(value)
+
+
+def result(benchmark, backend, population, cell_size, calls, seconds, **extra):
+    row = {"benchmark": benchmark, "backend": backend, "population": population,
+           "cell_size": "auto" if cell_size is None else cell_size,
+           "calls": calls, "seconds": round(seconds, 6),
+           "us_per_call": round(seconds / calls * 1e6, 3) if calls else None}
+    row.update(extra)
+    return row
+
+
+# A grid with `population` FishBoids spread over the window, plus the food points and two predators like a simulation
+def populated_grid(window, cell_size, backend, population, seed):
+    # The fish, their colours and the predators all draw from the same seeded streams
+    random = RandomStreams(seed)
+    grid = create_grid(window, cell_size, backend)
+    foodpoints = [FoodPoint(location[1], location[0], grid, 40, FOOD_RADIUS)
+                  for location in default_foodpoints(window)]
+    fishes = [FishBoid(window, randomColour(random.spawn), grid, foodpoints, True, False, NO_REPRODUCTION, random)
+              for i in range(population)]
+    grid.giveFishList(fishes)
+    for fish in fishes:
+        grid.addFish(fish)
+    predators = [PredatorBoid(window, grid, random) for i in range(2)]
+    grid.rebuild()
+    return grid, fishes, predators
+
+
+# Grid.addFish, removeFish, wipeFish, get_neighbour and neighbourhood, each called once for every fish
+def bench_grid(window, cell_size, backend, population, seed, repeats):
+    grid, fishes, predators = populated_grid(window, cell_size, backend, population, seed)
+    rows = []
+
+    def remove_all(state):
+        for fish in fishes:
+            grid.removeFish(fish)
+
+    def add_all(state):
+        for fish in fishes:
+            grid.addFish(fish)
+
+    def wipe_all(state):
+        for fish in fishes:
+            grid.wipeFish(fish)
+
+    def refill():
+        add_all(None)
+        grid.rebuild()
+
+    rows.append(result("grid.removeFish", backend, population, cell_size, population,
+                       best_time(remove_all, refill, repeats)))
+    rows.append(result("grid.addFish", backend, population, cell_size, population,
+                       best_time(add_all, lambda: remove_all(None), repeats)))
+    rows.append(result("grid.wipeFish", backend, population, cell_size, population,
+                       best_time(wipe_all, refill, repeats)))
+    refill()
+
+    # Each run starts from a rebuild, so the cached scans are made afresh
+    for radius in (SEPARATION_RADIUS, FLOCK_RADIUS):
+        def neighbours(state):
+            for fish in fishes:
+                grid.get_neighbour(fish, radius)
+
+        rows.append(result("grid.get_neighbour", backend, population, cell_size, population,
+                           best_time(neighbours, grid.rebuild, repeats), radius=radius))
+
+    # What FishBoid.update asks for: the neighbourhood within FLOCK_RADIUS and the part of it within SEPARATION_RADIUS
+    def neighbourhoods(state):
+        for fish in fishes:
+            grid.neighbourhood(fish, FLOCK_RADIUS).within(SEPARATION_RADIUS)
+
+    rows.append(result("grid.neighbourhood", backend, population, cell_size, population,
+                       best_time(neighbourhoods, grid.rebuild, repeats), radius=FLOCK_RADIUS))
+    return rows
+
+
+# FishBoid.update for up to `sample` fish of the population (the rest are still in the grid as neighbours) and
+# PredatorBoid.update for both predators
+def bench_boids(window, cell_size, backend, population, seed, repeats, sample):
+    rows = []
+    updated = min(population, sample)
+
+    def setup():
+        return populated_grid(window, cell_size, backend, population, seed)
+
+    def update_fish(state):
+        grid, fishes, predators = state
+        for fish in fishes[:updated]:
+            fish.update()
+
+    rows.append(result("FishBoid.update", backend, population, cell_size, updated,
+                       best_time(update_fish, setup, repeats)))
+
+    def update_predators(state):
+        grid, fishes, predators = state
+        for i in range(50):
+            for predator in predators:
+                predator.update()
+
+    rows.append(result("PredatorBoid.update", backend, population, cell_size, 100,
+                       best_time(update_predators, setup, repeats)))
+    return rows
+
+
+# Whole Simulation.ticks, the number the scaling curve is drawn from
+def bench_tick(window, cell_size, backend, population, seed, repeats, ticks, step_workers):
+    def setup():
+        return Simulation(window, cell_size, population, default_foodpoints(window), True, False, 40, NO_REPRODUCTION,
+                          backend, verbose=False, seed=seed, step_workers=step_workers)
+
+    def run(simulation):
+        simulation.step(ticks)
+
+    seconds = best_time(run, setup, repeats, lambda simulation: simulation.close())
+    return [result("Simulation.tick", backend, population, cell_size, ticks, seconds,
+                   ticks_per_second=round(ticks / seconds, 3))]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time the grid, boid and predator hot paths and whole ticks at a "
+                                                 "range of population sizes, and write the results as JSON")
+    parser.add_argument("--populations", type=int, nargs="+", default=[50, 500, 5000, 50000])
+    parser.add_argument("--cell-sizes", dest="cell_sizes", type=cell_size_arg, nargs="+", default=[10, 15, 30, None],
+                        help="cell sizes in pixels, or auto for the grid's own choice")
+    parser.add_argument("--backends", nargs="+", choices=("list", "array"), default=["list", "array"])
+    parser.add_argument("--benchmarks", nargs="+", choices=("grid", "boids", "tick"),
+                        default=["grid", "boids", "tick"])
+    parser.add_argument("--ticks", type=int, default=20, help="ticks timed for each full tick benchmark")
+    parser.add_argument("--sample", type=int, default=2000, help="most fish updated in the FishBoid.update benchmark")
+    parser.add_argument("--repeats", type=int, default=3, help="each benchmark reports the best of this many runs")
+    parser.add_argument("--numpy-kernels", dest="numpy_kernels", action="store_true",
+                        help="use the NumPy boid kernels even when Numba is installed")
+    parser.add_argument("--step-workers", dest="step_workers", type=int, default=0,
+                        help="processes that share the boid forces of each full tick (0 for a single process)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--width", type=int, default=1260)
+    parser.add_argument("--height", type=int, default=700)
+    parser.add_argument("--output", default="benchmark.json")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    window = (args.width, args.height)
+    compiled = BoidKernels.use_compiled(not args.numpy_kernels)
+    BoidKernels.warmup()
+    results = []
+    for backend in args.backends:
+        for cell_size in args.cell_sizes:
+            for population in args.populations:
+                if "grid" in args.benchmarks:
+                    results.extend(bench_grid(window, cell_size, backend, population, args.seed, args.repeats))
+                if "boids" in args.benchmarks:
+                    results.extend(bench_boids(window, cell_size, backend, population, args.seed, args.repeats,
+                                               args.sample))
+                if "tick" in args.benchmarks:
+                    results.extend(bench_tick(window, cell_size, backend, population, args.seed, args.repeats,
+                                              args.ticks, args.step_workers))
+                print(backend + " grid, cell size " + str(cell_size or "auto") + ", " + str(population) + " fish done")
+
+    # Ticks per second against population for each backend and cell size
+    scaling = {}
+    for row in results:
+        if row["benchmark"] == "Simulation.tick":
+            curve = scaling.setdefault(row["backend"], {}).setdefault(str(row["cell_size"]), {})
+            curve[str(row["population"])] = row["ticks_per_second"]
+
+    report = {"created": datetime.now().isoformat(timespec="seconds"),
+              "python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+              "settings": {"window": list(window), "seed": args.seed, "repeats": args.repeats, "ticks": args.ticks,
+                           "sample": args.sample, "compiled_kernels": compiled, "step_workers": args.step_workers},
+              "scaling": scaling, "results": results}
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print("Results written to " + args.output)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
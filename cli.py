@@ -0,0 +1,155 @@
+import argparse
+import importlib
+import json
+import sys
+import time
+from multiprocessing import Process
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+# Modules every simulation loads before its first tick, in the order they are first imported
+STARTUP_MODULES = ("numpy", "BoidKernels", "Simulation", "Checkpoint", "Telemetry", "main")
+# Modules that are only imported once they are needed: pygame when the window opens, pandas and matplotlib when the
+# run ends, and tkinter only by the menu in main.py
+DEFERRED_MODULES = ("pygame", "Renderer", "pandas", "matplotlib.pyplot", "tkinter")
+
+
+def yes_no(value):
+    if isinstance(value, bool):
+        return value
+    if value.lower() in ("yes", "y", "true", "1"):
+        return True
+    if value.lower() in ("no", "n", "false", "0"):
+        return False
+    raise argparse.ArgumentTypeError("expected yes or no, got " + value)
+
+
+# A cell size in pixels, "auto" lets the grid choose its own (None)
+def cell_size_arg(value):
+    if value is None or isinstance(value, int):
+        return value
+    return None if value == "auto" else int(value)
+
+
+# Settings from a JSON file, or a TOML file if its name ends in .toml. Keys are the flag names, with - or _
+def load_config(path):
+    with open(path, "rb") as file:
+        if path.endswith(".toml"):
+            if tomllib is None:
+                raise RuntimeError("Reading TOML config files needs Python 3.11 or later")
+            config = tomllib.load(file)
+        else:
+            config = json.load(file)
+    return {key.replace("-", "_"): value for key, value in config.items()}
+
+
+# Imports each module in turn and returns how long each took. A module's time leaves out anything an earlier one had
+# already imported. Libraries that are not installed are timed as None
+def timed_imports(names):
+    times = []
+    for name in names:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            times.append((name, None))
+            continue
+        times.append((name, time.perf_counter() - started))
+    return times
+
+
+def print_import_times(startup, deferred):
+    width = max(len(name) for name, seconds in startup + deferred) + 2
+    print("Imported before the first tick:")
+    for name, seconds in startup:
+        print("  " + name.ljust(width) + ("not installed" if seconds is None else
+                                          str(round(seconds * 1000, 1)) + " ms"))
+    print("  " + "total".ljust(width) + str(round(sum(seconds or 0 for name, seconds in startup) * 1000, 1)) + " ms")
+    print("Imported only when needed:")
+    for name, seconds in deferred:
+        print("  " + name.ljust(width) + ("not installed" if seconds is None else
+                                          str(round(seconds * 1000, 1)) + " ms"))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Start simulations with the settings of the main.py menu, taken from "
+                                                 "flags or a config file, without loading the menu")
+    parser.add_argument("--config", default=None, help="JSON or TOML file of settings, flags given as well win")
+    parser.add_argument("--name", default="Simulation", help="name of the runs, each gets its number added")
+    parser.add_argument("--simulations", type=int, default=1, help="number of simulations run side by side")
+    parser.add_argument("--fish-count", dest="fish_count", type=int, default=50)
+    parser.add_argument("--cell-size", dest="cell_size", type=cell_size_arg, default=15,
+                        help="grid cell size in pixels, or auto for the grid's own choice")
+    parser.add_argument("--width", type=int, default=1260)
+    parser.add_argument("--height", type=int, default=700)
+    parser.add_argument("--food-quantity", dest="food_quantity", type=int, default=40)
+    parser.add_argument("--reproduce-time", dest="reproduce_time", type=int, default=2250)
+    parser.add_argument("--evo-and-learn", dest="evo_and_learn", type=yes_no, default=True)
+    parser.add_argument("--stochastic", type=yes_no, default=False)
+    parser.add_argument("--grid-backend", dest="grid_backend", choices=("list", "array"), default="list")
+    parser.add_argument("--ticks-per-frame", dest="ticks_per_frame", type=int, default=1)
+    parser.add_argument("--target-fps", dest="target_fps", type=int, default=60)
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="save each run to '<name> checkpoint.npz' as it goes and when its window is closed")
+    parser.add_argument("--checkpoint-every", dest="checkpoint_every", type=int, default=3600,
+                        help="ticks between checkpoints")
+    parser.add_argument("--resume", default=None, help="carry on from a checkpoint instead (a single run)")
+    parser.add_argument("--profile", action="store_true",
+                        help="time the phases of each tick and frame, shown on screen and written to the telemetry")
+    parser.add_argument("--import-times", dest="import_times", action="store_true",
+                        help="print how long each module takes to import and exit")
+    return parser
+
+
+# Flags override the config file, which overrides the defaults
+def parse_args(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.config is not None:
+        config = load_config(args.config)
+        unknown = sorted(set(config) - set(vars(args)))
+        if unknown:
+            parser.error("unknown settings in " + args.config + ": " + ", ".join(unknown))
+        parser.set_defaults(**config)
+        args = parser.parse_args(argv)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    startup = timed_imports(STARTUP_MODULES)
+    if args.import_times:
+        print_import_times(startup, timed_imports(DEFERRED_MODULES))
+        return 0
+
+    simulate = sys.modules["main"].simulate
+    from Simulation import default_foodpoints
+    window = (args.width, args.height)
+    runs = 1 if args.resume is not None else args.simulations
+    jobs = []
+    for i in range(runs):
+        name = args.name + "_" + str(i)
+        jobs.append(([name, window, args.cell_size, args.fish_count, default_foodpoints(window), args.evo_and_learn,
+                      args.stochastic, args.food_quantity, args.reproduce_time],
+                     {"grid_backend": args.grid_backend, "ticks_per_frame": args.ticks_per_frame,
+                      "target_fps": args.target_fps, "checkpoint_every": args.checkpoint_every,
+                      "checkpoint_path": name + " checkpoint.npz" if args.checkpoint else None,
+                      "resume_from": args.resume, "profile": args.profile}))
+
+    # A single run stays in this process, so it does not pay for starting another one
+    if len(jobs) == 1:
+        simulate(*jobs[0][0], **jobs[0][1])
+        return 0
+    processes = [Process(target=simulate, args=job_args, kwargs=job_kwargs) for job_args, job_kwargs in jobs]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
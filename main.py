@@ -1,184 +1,87 @@
 from datetime import datetime
 from multiprocessing import Process
 
-import tkinter as tk
-from tkinter import ttk
-import tkinter.font as tkFont
-import numpy as np
-import pandas as pd
-import pygame
-from matplotlib import pyplot as plt
-from pygame import freetype
-
-from BoidGrid import Grid
-from FishBoid import FishBoid
-from FoodPoint import FoodPoint
-from PredatorBoid import PredatorBoid
-
-
-# Create a random RGB value
-def randomColour():
-    return (np.random.randint(0, 255), np.random.randint(0, 255), np.random.randint(0, 255))
+from Checkpoint import Checkpointer, load_checkpoint
+from FrameScheduler import FrameScheduler
+from Profiler import NullProfiler, Profiler
+from Simulation import Simulation, default_foodpoints
+from Telemetry import Telemetry
 
 
 # Creates the pygame simulation window, can customise the window size, cell size, number of boids and locations of food
-def simulate(sim_name, window, cell_size, fish_count, foodpoint_locations, evo_and_learn, stochastic,food_quantity,reproduce_time):
-    pygame.init()
-    pygame.display.set_caption(str(sim_name))
-    screen = pygame.display.set_mode(window)
-    grid = Grid(window, cell_size)
-
-    # Food points are created at the points specified above, the amount of food and size of the food point can be changed
-    # In this case the foodpoint can feed 30 fish before disabling and have size 2x2 (cells)
-    foodpoints = [FoodPoint(foodpoint[1], foodpoint[0], grid, food_quantity, 2) for foodpoint in foodpoint_locations]
-
-    # Creates a list of fish with random colours
-    fishes = [FishBoid(window, randomColour(), grid, foodpoints, evo_and_learn, stochastic,reproduce_time) for i in range(fish_count)]
-    predators = [PredatorBoid(window, grid) for i in range(2)]
-    # Give grid object the fish list reference, allowing it to remove fish from grid that are dead
-    grid.giveFishList(fishes)
-
-    # Create the predator
-    #predator = PredatorBoid(window, grid)
-
-    clock = pygame.time.Clock()
-
-    Fish_eaten = 0
-    Fish_starved = 0
+# ticks_per_frame sets how many ticks are simulated for each drawn frame, and target_fps the frame rate to draw at.
+# With a checkpoint_path the run is saved every checkpoint_every ticks and when the window is closed, and resume_from
+# carries on from a saved checkpoint instead of starting a new run (the other settings are then taken from it).
+# Deaths and population snapshots are streamed to the telemetry directory, by default one named after the simulation.
+# With profile on, the phases of each tick and frame are timed, shown on screen and written to the telemetry.
+# pygame and matplotlib are only imported once they are needed, so every simulation process starts quickly
+def simulate(sim_name, window, cell_size, fish_count, foodpoint_locations, evo_and_learn, stochastic,food_quantity,reproduce_time,
+             grid_backend="list", ticks_per_frame=1, target_fps=60, checkpoint_path=None, checkpoint_every=3600,
+             resume_from=None, telemetry_path=None, profile=False):
+    from Renderer import Renderer
+
+    telemetry = Telemetry(telemetry_path or str(sim_name + " telemetry"))
+    profiler = Profiler(telemetry) if profile else NullProfiler()
+    if resume_from is not None:
+        simulation = load_checkpoint(resume_from, telemetry=telemetry)
+        simulation.profiler = profiler
+    else:
+        simulation = Simulation(window, cell_size, fish_count, foodpoint_locations, evo_and_learn, stochastic,
+                                food_quantity, reproduce_time, grid_backend, telemetry=telemetry, profiler=profiler)
+    renderer = Renderer(simulation, sim_name)
+    scheduler = FrameScheduler(ticks_per_frame, target_fps)
+    checkpointer = Checkpointer(checkpoint_path, checkpoint_every) if checkpoint_path else None
 
     running = True
-    Time = 0
-
-    oldest_fish = None
-
-    # Data collection for performance
-    y = []
 
     # This is the gameplay loop, closes when the x button of the window is pressed
     while running:
-        Time += 1
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-        if not fishes:
+        running = renderer.handle_events()
+        if simulation.finished:
             running = False
 
-        # Top 10% eldest fish considered "elders", they will teach the juvenile fish
-        elder_idx = len(fishes) // 10
-        elders = fishes[:elder_idx]
-        for elder in elders:
-            elder.isElder = True
-
-        # Youngest 20% of fish considered "juveniles", they will learn from the elders
-        juvenile_idx = int((len(fishes) * 0.8))
-        juveniles = fishes[juvenile_idx:]
-        for juvenile in juveniles:
-            juvenile.isJuvenile = True
-
-        screen.fill((153, 238, 255))
-
-        # Update the foodpoints, feeding fish in its radius, if it is inactive (no food left) turn red
-        for foodpoint in foodpoints:
-            foodpoint.detectFish()
-            if foodpoint.active:
-                colour = (0, 140, 0)
-            else:
-                colour = (140, 0, 0)
-            length = cell_size * foodpoint.size * 4
-            top_left_x = foodpoint.x - length / 2
-            top_left_y = foodpoint.y - length / 2
-            rectangle = pygame.Rect(top_left_y, top_left_x, length, length)
-            pygame.draw.rect(screen, colour, rectangle)
-            pygame.draw.circle(screen, (0, 0, 0), (int(foodpoint.y), int(foodpoint.x)), 3)
-
-        # Update the fishes, if the fish runs out of hunger, it is removed
-        for fish in fishes:
-            fish.update()
-            if fish.Hunger <= 0:
-                grid.wipeFish(fish)
-                fishes.remove(fish)
-                print("Fish Starved")
-                Fish_starved += 1
-                generation = ((Time - fish.age // 60) // 2700)
-                y.append((generation, fish.age // 60))
-            # If a fish is close to starving, it will get paler and paler.
-            #pygame.draw.polygon(screen,np.array((255,255,255)) - np.round(fish.Hunger/fish.maxHunger * np.array(fish.colour)), fish.draw_shape())
-            pygame.draw.polygon(screen, fish.colour, fish.draw_shape())
-        # Update the predator, returns the fish it has eaten, or none if it did not eat in that frame
-        for predator in predators:
-            Eaten_fish = predator.update()
-            if isinstance(Eaten_fish, FishBoid):
-                if any(fish == Eaten_fish for fish in fishes):
-                    fishes.remove(Eaten_fish)
-                    print("Fish Eaten")
-                    Fish_eaten += 1
-                    generation = ((Time - Eaten_fish.age) // 2700)
-                    y.append((generation, Eaten_fish.age // 60))
-            pygame.draw.polygon(screen, (108, 119, 128), predator.draw_shape())
-            pygame.draw.polygon(screen, (0, 0, 0), predator.draw_shape(),width=1)
-
-        # Visually show stats about the state of the simulation
-        ft_font = freetype.Font(None, 25)
-        ft_font.render_to(screen, (10, 10), 'Number of Fish: ' + str(len(fishes)), (250, 250, 250))
-        ft_font.render_to(screen, (10, 60), 'Number of Fish Eaten: ' + str(Fish_eaten), (250, 250, 250))
-        ft_font.render_to(screen, (10, 110), 'Number of Fish Starved: ' + str(Fish_starved), (250, 250, 250))
-
-        # Finds the youngest and fish that has lived the longest
-        if fishes:
-            # This checks whether the current oldest fish is older than the previous eldest fish
-            oldest_fish = fishes[0] if oldest_fish is None or fishes[0].age > oldest_fish.age else oldest_fish
-            youngest_fish = fishes[-1]
-            genes = [str(np.round(oldest_fish.S_co, 2)),
-                     str(np.round(oldest_fish.A_co, 2)),
-                     str(np.round(oldest_fish.C_co, 2)),
-                     str(np.round(oldest_fish.f_strength, 2)),
-                     str(np.round(oldest_fish.p_strength, 2)),
-                     str(np.round(oldest_fish.Hungry_co, 2))]
-
-        ft_font.render_to(screen, (10, 180), 'Oldest fish\'s genes: ' + str(genes), (250, 250, 250))
-        ft_font.render_to(screen, (10, 220), 'Oldest fish\'s age: ' + str(oldest_fish.age // 60), (250, 250, 250))
-        ft_font.render_to(screen, (10, 260), 'Oldest fish\'s generation: ~' + str((Time - oldest_fish.age) // 2700),
-                          (250, 250, 250))
-        ft_font.render_to(screen, (10, 300), 'Youngest fish\'s generation: ~' + str((Time - youngest_fish.age) // 2700),
-                          (250, 250, 250))
-
-        # All current juveniles have their isJuvenile field set to false, as they may not be juveniles in the next frame
-        for juvenile in juveniles:
-            juvenile.isJuvenile = False
-
-        # Time is every 60 ticks, so if the game is run at 60 ticks per second, it should represents seconds
-        # Please note that as more fish spawn, the game lags and time will not go up as smoothly
-        ft_font.render_to(screen, (10, 340), 'Time: ' + str(Time // 60), (250, 250, 250))
-
-        pygame.display.update()
-
-        clock.tick(60)
-
-    # Creates a new file containing the important statistics if the simulation, the file will be created at the directory
-    # of main.py and will have the name of the corresponding simulation, along with the time it ended
-    now = datetime.now()
-    with open(str(sim_name + " " + now.strftime("%H.%M.%S") + ".txt"), "a") as file:
-        file.write(str(sim_name + " statistics: "))
-        file.write(str("\nFish Eaten: " + str(Fish_eaten)))
-        file.write(str("\nFish Starved: " + str(Fish_starved)))
-        file.write(str("\nTotal Fish: " + str((Fish_eaten + Fish_starved))))
-        file.write(str("\nBest Genotype: " + str(genes)))
-        file.write(str("\nThis simulation ended at: " + str(now)))
-        file.write(str("\n\nWas there evolution and learning?: " + str(evo_and_learn)))
-        file.write(str("\nWas there stochasticity added?: " + str(stochastic)))
-
-    # Find average age for each generation
-    print(y)
-    final_y = pd.DataFrame(y)
-    print(final_y)
-    final_y = final_y.groupby([0]).mean()
+        # Step however many ticks are due, then only draw the final state
+        simulation.step(scheduler.ticks_due())
+        if checkpointer is not None:
+            checkpointer.maybe_save(simulation)
+        renderer.draw()
+
+        scheduler.wait()
+
+    if checkpointer is not None:
+        checkpointer.save(simulation)
+        checkpointer.wait()
+    write_summary(simulation, sim_name)
+    profiler.close()
+    telemetry.close()
+
+    # Find average age for each generation, from the deaths written to the telemetry
+    deaths = telemetry.read("deaths")
+    print(deaths)
+    final_y = deaths.groupby("generation")["age"].mean()
     print(final_y)
 
     # Plot data on a line graph
+    from matplotlib import pyplot as plt
     plt.plot(final_y)
     plt.show()
 
-    pygame.quit()
+    renderer.close()
+
+
+# Creates a new file containing the important statistics if the simulation, the file will be created at the directory
+# of main.py and will have the name of the corresponding simulation, along with the time it ended
+def write_summary(simulation, sim_name):
+    now = datetime.now()
+    with open(str(sim_name + " " + now.strftime("%H.%M.%S") + ".txt"), "a") as file:
+        file.write(str(sim_name + " statistics: "))
+        file.write(str("\nFish Eaten: " + str(simulation.Fish_eaten)))
+        file.write(str("\nFish Starved: " + str(simulation.Fish_starved)))
+        file.write(str("\nTotal Fish: " + str((simulation.Fish_eaten + simulation.Fish_starved))))
+        file.write(str("\nBest Genotype: " + str(simulation.oldest_genes())))
+        file.write(str("\nThis simulation ended at: " + str(now)))
+        file.write(str("\n\nWas there evolution and learning?: " + str(simulation.evo_and_learn)))
+        file.write(str("\nWas there stochasticity added?: " + str(simulation.stochastic)))
 
 
 def fish_change_val(*args):
@@ -215,10 +118,7 @@ def start_sim(*args):
     screen_height = int(screen_height_entry.get()) if screen_height_entry.get().isnumeric() else 700
     screen_size = (screen_width,screen_height)
 
-    foodpoint_locations = [(screen_size[0] // 6, screen_size[1] // 6), (screen_size[0] // 6, screen_size[1] * 5 // 6),
-                           (screen_size[0] * 5 // 6, screen_size[1] // 6),
-                           (screen_size[0] * 5 // 6, screen_size[1] * 5 // 6),
-                           (screen_size[0] // 2, screen_size[1] // 2)]
+    foodpoint_locations = default_foodpoints(screen_size)
 
     evolve_and_learn = True if evol_val.get() == "Yes" else False
     stochasticity =  True if stoch_val.get() == "Yes" else False
@@ -231,6 +131,11 @@ def start_sim(*args):
                       stochasticity,food_amount,reproduce_time]).start()
 
 if __name__ == '__main__':
+    # tkinter is only needed by the menu, the simulation processes never load it
+    import tkinter as tk
+    from tkinter import ttk
+    import tkinter.font as tkFont
+
     # Change the following values to affect the simulation, the variable names indicate their function
 
     # Simple GUI to enter values #
@@ -0,0 +1,46 @@
+import argparse
+import sys
+
+from Checkpoint import Checkpointer, load_checkpoint
+from Profiler import Profiler
+from Telemetry import Telemetry
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Carry on a saved simulation without a display, saving checkpoints "
+                                                 "as it goes")
+    parser.add_argument("checkpoint", help="checkpoint file to resume from")
+    parser.add_argument("--ticks", type=int, default=None, help="number of further ticks to run")
+    parser.add_argument("--seconds", type=float, default=None, help="wall-clock budget of the run")
+    parser.add_argument("--checkpoint-every", dest="checkpoint_every", type=int, default=3600,
+                        help="ticks between checkpoints")
+    parser.add_argument("--output", default=None, help="where to save checkpoints, by default the resumed file")
+    parser.add_argument("--telemetry", default=None, help="directory to stream deaths and population snapshots to")
+    parser.add_argument("--profile", action="store_true",
+                        help="time the phases of each tick and write their percentiles to the telemetry")
+    parser.add_argument("--quiet", action="store_true", help="do not print a line for every death")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    telemetry = Telemetry(args.telemetry) if args.telemetry else None
+    simulation = load_checkpoint(args.checkpoint, verbose=not args.quiet, telemetry=telemetry)
+    if args.profile:
+        simulation.profiler = Profiler(telemetry)
+    print("Resuming " + args.checkpoint + " at tick " + str(simulation.Time) + " with " +
+          str(len(simulation.fishes)) + " fish")
+    checkpointer = Checkpointer(args.output or args.checkpoint, args.checkpoint_every)
+    max_ticks = None if args.ticks is None else simulation.Time + args.ticks
+    summary = simulation.run(max_ticks, args.seconds, checkpointer=checkpointer)
+    checkpointer.save(simulation)
+    checkpointer.wait()
+    simulation.profiler.close()
+    if telemetry is not None:
+        telemetry.close()
+    for name, value in summary.items():
+        print(name + ": " + str(value))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+from FishSchool import GENES
+from Simulation import Simulation, default_foodpoints
+
+# Parameters that can be swept, in the order they appear in the results table
+PARAMETERS = ("fish_count", "cell_size", "food_quantity", "reproduce_time", "evo_and_learn", "stochastic")
+# Columns of the results table: the parameters and seed of each run, its summary (Simulation.summary and the time it
+# took) and the error that stopped it, empty for runs that finished
+COLUMNS = (PARAMETERS + ("seed", "ticks", "fish_alive", "fish_eaten", "fish_starved", "mean_age_at_death",
+                         "oldest_age") + tuple("mean_" + gene for gene in GENES) + ("seconds", "error"))
+
+
+def yes_no(value):
+    if value.lower() in ("yes", "y", "true", "1"):
+        return True
+    if value.lower() in ("no", "n", "false", "0"):
+        return False
+    raise argparse.ArgumentTypeError("expected yes or no, got " + value)
+
+
+# Runs one simulation without a display and returns its parameters along with its summary. A run that fails returns
+# its parameters and the error instead, so one bad run does not stop the rest of the sweep
+def run_one(job):
+    config, seed, settings = job
+    row = dict(config)
+    row["seed"] = seed
+    try:
+        cell_size = None if config["cell_size"] == "auto" else int(config["cell_size"])
+        simulation = Simulation(settings["screen_size"], cell_size, config["fish_count"],
+                                default_foodpoints(settings["screen_size"]), config["evo_and_learn"],
+                                config["stochastic"], config["food_quantity"], config["reproduce_time"],
+                                settings["grid_backend"], verbose=False, seed=seed)
+        row.update(simulation.run(settings["max_ticks"], settings["max_seconds"]))
+        row["error"] = ""
+    except Exception as error:
+        row["error"] = type(error).__name__ + ": " + str(error)
+    return row
+
+
+# Every combination of the swept values, each repeated with `seeds` different seeds
+def make_jobs(args):
+    settings = {"screen_size": (args.width, args.height), "grid_backend": args.grid_backend,
+                "max_ticks": args.ticks, "max_seconds": args.seconds}
+    jobs = []
+    values = [getattr(args, name) for name in PARAMETERS]
+    for combination in itertools.product(*values):
+        config = dict(zip(PARAMETERS, combination))
+        for i in range(args.seeds):
+            jobs.append((config, args.seed + i, settings))
+    return jobs
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a parameter sweep of headless simulations on a process pool and "
+                                                 "collect the results into a single CSV table")
+    parser.add_argument("--fish-count", dest="fish_count", type=int, nargs="+", default=[50])
+    parser.add_argument("--cell-size", dest="cell_size", nargs="+", default=[15],
+                        help="grid cell sizes in pixels, or auto for the grid's own choice")
+    parser.add_argument("--food-quantity", dest="food_quantity", type=int, nargs="+", default=[40])
+    parser.add_argument("--reproduce-time", dest="reproduce_time", type=int, nargs="+", default=[2250])
+    parser.add_argument("--evo-and-learn", dest="evo_and_learn", type=yes_no, nargs="+", default=[True])
+    parser.add_argument("--stochastic", type=yes_no, nargs="+", default=[False])
+    parser.add_argument("--seeds", type=int, default=1, help="number of seeds to run for each combination")
+    parser.add_argument("--seed", type=int, default=0, help="first seed, the others follow on from it")
+    parser.add_argument("--ticks", type=int, default=20000, help="tick budget of each run")
+    parser.add_argument("--seconds", type=float, default=None, help="wall-clock budget of each run")
+    parser.add_argument("--width", type=int, default=1260)
+    parser.add_argument("--height", type=int, default=700)
+    parser.add_argument("--grid-backend", dest="grid_backend", choices=("list", "array"), default="array")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="size of the process pool")
+    parser.add_argument("--output", default="sweep_results.csv")
+    return parser.parse_args(argv)
+
+
+# Results are written to the table as each run finishes, so a partly finished sweep still has everything done so far
+def main(argv=None):
+    args = parse_args(argv)
+    jobs = make_jobs(args)
+    print("Running " + str(len(jobs)) + " simulations on " + str(args.workers) + " processes")
+    started = time.perf_counter()
+    failed = 0
+    with open(args.output, "w", newline="") as file, Pool(args.workers) as pool:
+        writer = csv.DictWriter(file, fieldnames=COLUMNS)
+        writer.writeheader()
+        for done, row in enumerate(pool.imap_unordered(run_one, jobs), 1):
+            writer.writerow(row)
+            file.flush()
+            if row["error"]:
+                failed += 1
+                print("Run with seed " + str(row["seed"]) + " failed: " + row["error"])
+            print(str(done) + "/" + str(len(jobs)) + " done after " + str(round(time.perf_counter() - started)) + "s")
+    if failed:
+        print(str(failed) + " of " + str(len(jobs)) + " runs failed, see the error column")
+    print("Results written to " + args.output)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
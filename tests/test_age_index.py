@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from AgeIndex import AgeIndex
+from Simulation import Simulation, default_foodpoints
+
+WINDOW = (630, 350)
+
+
+# Small and large batches take different paths (single updates and a rebuild), both are checked against a sort
+def test_ranks_match_a_sort():
+    generator = np.random.default_rng(4)
+    ages = AgeIndex(8)
+    alive = set()
+    next_id = 0
+    for batch in [1, 3, 40, 2, 100, 5]:
+        born = np.arange(next_id, next_id + batch)
+        next_id += batch
+        ages.add(born)
+        alive.update(born.tolist())
+        dead = generator.choice(sorted(alive), len(alive) // 3, replace=False)
+        ages.remove(dead)
+        alive.difference_update(dead.tolist())
+        ids = np.array(sorted(alive))
+        assert len(ages) == len(ids)
+        assert [ages.kth(k) for k in range(1, len(ids) + 1)] == ids.tolist()
+        assert ages.oldest() == ids[0] and ages.youngest() == ids[-1]
+    with pytest.raises(ValueError):
+        ages.kth(len(alive) + 1)
+
+
+# The elders and juveniles have to be the same fish the original slices picked out of a list in birth order
+def test_age_classes_match_argsort():
+    simulation = Simulation(WINDOW, 15, 60, default_foodpoints(WINDOW), True, True, 10, 300, "list", verbose=False,
+                            seed=5)
+    fishes = simulation.fishes
+    # The first tick marks the oldest tenth of the starting fish
+    elders = set(fishes.fish_id[:len(fishes) // 10].tolist())
+    for tick in range(300):
+        simulation.step()
+        n = len(fishes)
+        by_age = np.argsort(fishes.fish_id[:n], kind="stable")
+        elders.update(fishes.fish_id[by_age[:n // 10]].tolist())
+        # The tick classifies the fish before they move, so the births and deaths since then are caught up first
+        fishes.classify_ages()
+        juveniles = np.zeros(n, dtype=bool)
+        juveniles[by_age[int(n * 0.8):]] = True
+        np.testing.assert_array_equal(fishes.isJuvenile[:n], juveniles)
+        # Like the original loop, a fish stays an elder once it has been one
+        assert set(fishes.fish_id[:n][fishes.isElder[:n]].tolist()) == elders.intersection(fishes.fish_id[:n].tolist())
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from Checkpoint import load_checkpoint, save_checkpoint
+from FishSchool import FishSchool
+from Simulation import Simulation, default_foodpoints
+
+WINDOW = (630, 350)
+
+
+def state(simulation):
+    fishes = simulation.fishes
+    arrays = [getattr(fishes, name)[:len(fishes)].copy() for name in FishSchool.FIELDS]
+    arrays.append(np.array([[predator.x, predator.y, predator.Vx, predator.Vy] for predator in simulation.predators]))
+    arrays.append(np.array([[foodpoint.capacity, foodpoint.active, foodpoint.internalTime]
+                            for foodpoint in simulation.foodpoints]))
+    counters = (simulation.Time, simulation.Fish_eaten, simulation.Fish_starved, simulation.death_age_total)
+    return arrays, counters
+
+
+# A resumed run has to follow the saved one exactly, tick for tick
+@pytest.mark.parametrize("backend", ["list", "array"])
+def test_resume_matches_uninterrupted_run(backend, tmp_path):
+    path = str(tmp_path / "checkpoint.npz")
+    simulation = Simulation(WINDOW, 15, 60, default_foodpoints(WINDOW), True, True, 10, 300, backend, verbose=False,
+                            seed=2)
+    simulation.step(200)
+    save_checkpoint(simulation, path, background=False)
+    simulation.step(200)
+    resumed = load_checkpoint(path, verbose=False)
+    resumed.step(200)
+
+    expected, expected_counters = state(simulation)
+    found, found_counters = state(resumed)
+    assert found_counters == expected_counters
+    for a, b in zip(expected, found):
+        np.testing.assert_array_equal(a, b)
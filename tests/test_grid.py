@@ -0,0 +1,26 @@
+import pytest
+
+from Simulation import Simulation, default_foodpoints
+
+WINDOW = (630, 350)
+
+
+# With debug on, both grids check themselves after every change, so any duplicate or stale entry raises straight away
+@pytest.mark.parametrize("backend", ["list", "array"])
+def test_grid_stays_consistent(backend):
+    simulation = Simulation(WINDOW, 15, 60, default_foodpoints(WINDOW), True, True, 10, 300, backend, verbose=False,
+                            seed=1)
+    simulation.grid.debug = True
+    simulation.step(300)
+    simulation.grid.check_consistency()
+    assert simulation.Fish_eaten > 0
+
+
+def test_duplicate_entry_is_reported():
+    simulation = Simulation(WINDOW, 15, 20, default_foodpoints(WINDOW), True, True, 10, 300, "list", verbose=False,
+                            seed=1)
+    fish = simulation.fishes[0]
+    row, column = simulation.grid.cell_of[fish]
+    simulation.grid.grid[(row + 1) % simulation.grid.rows][column].append(fish)
+    with pytest.raises(RuntimeError):
+        simulation.grid.check_consistency()
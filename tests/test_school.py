@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from FishSchool import learn_from_elders
+from Simulation import Simulation, default_foodpoints
+
+WINDOW = (630, 350)
+
+
+def make_simulation(fish_count=60):
+    return Simulation(WINDOW, 15, fish_count, default_foodpoints(WINDOW), True, True, 10, 300, "list",
+                      verbose=False, seed=3)
+
+
+# Every live fish keeps its ID, the ID lookup points back at its slot and the grid holds exactly the live fish
+def check_school(simulation):
+    fishes = simulation.fishes
+    n = len(fishes)
+    ids = fishes.fish_id[:n]
+    assert len(np.unique(ids)) == n
+    np.testing.assert_array_equal(fishes.slot_of[ids], np.arange(n))
+    assert np.count_nonzero(fishes.slot_of >= 0) == n
+    assert [fish._index for fish in fishes] == list(range(n))
+    in_grid = [entity for entity in simulation.grid.cell_of if entity not in simulation.predators]
+    assert set(in_grid) == set(fishes.fish) and len(in_grid) == n
+
+
+def test_flush_fills_holes_from_the_end():
+    simulation = make_simulation(10)
+    fishes = simulation.fishes
+    before = fishes.fish_id[:10].tolist()
+    fishes.remove([fishes[2], fishes[5], fishes[8]])
+    assert len(fishes) == 10
+    fishes.flush_removals()
+    # The last fish fills the lowest hole and the one before it the next hole, the fish in slot 8 was removed
+    assert fishes.fish_id[:7].tolist() == [before[0], before[1], before[9], before[3], before[4], before[7], before[6]]
+    check_school(simulation)
+
+
+def test_school_stays_consistent_over_a_run():
+    simulation = make_simulation()
+    simulation.step(300)
+    assert simulation.Fish_eaten > 0 and simulation.fishes.next_id > 60
+    check_school(simulation)
+
+
+# The batched update has to give what calling FishBoid.learn pair by pair gives, for the closed form and for the
+# fallback taken when a fish both learns and teaches
+@pytest.mark.parametrize("overlap", [False, True])
+def test_learn_from_elders_matches_learn(overlap):
+    simulation = make_simulation(40)
+    fishes = simulation.fishes
+    generator = np.random.default_rng(6)
+    juveniles = np.sort(generator.integers(30, 40, 50))
+    elders = generator.integers(0, 40 if overlap else 10, 50)
+    genes = fishes.genes[:40].copy()
+    learn_from_elders(genes, juveniles, elders)
+    for juvenile, elder in zip(juveniles.tolist(), elders.tolist()):
+        fishes[juvenile].learn(fishes[elder])
+    np.testing.assert_allclose(genes, fishes.genes[:40], rtol=0, atol=1e-12)